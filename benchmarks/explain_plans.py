@@ -0,0 +1,285 @@
+"""
+Проверка планов запросов репозиториев через EXPLAIN.
+
+Скрипт в одной транзакции (которая в конце откатывается) создает отдельную схему,
+таблицы моделей с их индексами, заполняет их реалистичным объемом данных и делает ANALYZE.
+Затем вызывает методы репозиториев так же, как их вызывают сервисы, перехватывает
+реальный SQL (включая догрузку связей) и выполняет для него EXPLAIN (FORMAT JSON).
+
+Проверка падает (код возврата 1), если:
+- в плане есть Seq Scan по таблицам моделей;
+- форма плана (типы узлов и индексы) отличается от сохраненной в explain_baseline.json
+  (эталон в репозитории снят на PostgreSQL 16 с данными по умолчанию);
+- эталона (файла или плана отдельного запроса) нет: без него сравнение планов не выполняется,
+  поэтому проверка только на Seq Scan включается явно флагом --no-baseline.
+
+Данные рабочей схемы не затрагиваются. Нужна БД PostgreSQL 13+ из настроек приложения (.env).
+
+Запуск:
+    poetry run python -m benchmarks.explain_plans
+    poetry run python -m benchmarks.explain_plans --users 50000 --accounts-per-profile 4
+    poetry run python -m benchmarks.explain_plans --update-baseline   # принять текущие планы
+    poetry run python -m benchmarks.explain_plans --no-baseline       # только Seq Scan, без эталона
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, create_async_engine
+
+from src.api.auth.manager import UserDatabase
+from src.api.auth.router import USER_READ_COLUMNS
+from src.config.loader import DATABASE_URL
+from wms_services.models import Base, User, ProfileModel, WBAccountModel, WBAccountStatus
+from wms_services.repositories import (
+    ProfileDBRepository,
+    WBAccountsDBRepo,
+    UserDBRepository,
+    PROFILE_WITH_USER,
+    ACCOUNT_LIST,
+)
+from wms_services.repositories.pagination import encode_cursor
+
+SCHEMA = "explain_check"
+BASELINE_PATH = Path(__file__).with_name("explain_baseline.json")
+CHECKED_TABLES = {User.__tablename__, ProfileModel.__tablename__, WBAccountModel.__tablename__}
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+SEED_SQL = [
+    """
+    INSERT INTO "user" (id, email, hashed_password, is_active, is_superuser, is_verified,
+                        first_name, second_name, last_name, role, created_at, updated_at)
+    SELECT gen_random_uuid(), 'user' || g || '@example.com', md5(g::text), true, false, true,
+           'Имя', 'Фамилия', 'Отчество', 'Пользователь',
+           now() - g * interval '1 minute', now()
+    FROM generate_series(1, :users) AS g
+    """,
+    """
+    INSERT INTO profiles (id, user_id, created_at, updated_at)
+    SELECT gen_random_uuid(), id, created_at, now() FROM "user"
+    """,
+    """
+    INSERT INTO wb_accounts (id, profile_id, name, wb_token, token_metadata, status, details,
+                             last_token_validate_at, token_expires_at, created_at, updated_at)
+    SELECT gen_random_uuid(), p.id, 'Кабинет ' || a, md5(random()::text),
+           CASE WHEN random() < 0.02 THEN '{"scopes": ["content", "marketplace", "analytics"]}'::jsonb
+                ELSE '{"scopes": ["content", "marketplace"]}'::jsonb END,
+           floor(random() * 3)::int,
+           CASE WHEN random() < 0.01 THEN jsonb_build_object('warehouse_id', a) END,
+           CASE WHEN random() < 0.05 THEN NULL ELSE now() - random() * interval '7 days' END,
+           now() + (random() * 180 - 1) * interval '1 day',
+           p.created_at + a * interval '1 second', now()
+    FROM profiles AS p, generate_series(1, :accounts) AS a
+    """,
+    "ANALYZE",
+]
+
+
+class StatementRecorder:
+    """Запоминает SQL, который уходит в драйвер, пока включен"""
+
+    def __init__(self, connection: AsyncConnection):
+        self.statements: list[tuple[str, Any]] = []
+        self.enabled = False
+        event.listen(connection.sync_connection, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        # SAVEPOINT/RELEASE сессии и прочие служебные команды EXPLAIN не поддерживает
+        if self.enabled and not executemany and statement.lstrip().upper().startswith(EXPLAINABLE):
+            self.statements.append((statement, parameters))
+
+    async def capture(self, call: Callable[[], Awaitable[Any]]) -> list[tuple[str, Any]]:
+        self.statements = []
+        self.enabled = True
+        try:
+            await call()
+        finally:
+            self.enabled = False
+        return self.statements
+
+
+def plan_nodes(plan: dict) -> list[dict]:
+    nodes = [plan]
+    for child in plan.get("Plans", ()):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def plan_shape(plan: dict) -> list[str]:
+    """Форма плана для сравнения с эталоном: типы узлов и используемые индексы/таблицы"""
+    shape = []
+    for node in plan_nodes(plan):
+        target = node.get("Index Name") or node.get("Relation Name")
+        shape.append(f"{node['Node Type']}:{target}" if target else node["Node Type"])
+    return shape
+
+
+async def explain(connection: AsyncConnection, statement: str, parameters: Any) -> dict:
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+async def sample(connection: AsyncConnection) -> dict[str, Any]:
+    """Ключи из середины таблиц, чтобы запросы попадали в реальные данные"""
+    row = (await connection.execute(text(
+        """
+        SELECT p.id AS profile_id, p.user_id, u.email, a.id AS account_id, a.created_at, p.created_at
+        FROM wb_accounts AS a
+        JOIN profiles AS p ON p.id = a.profile_id
+        JOIN "user" AS u ON u.id = p.user_id
+        ORDER BY a.created_at
+        OFFSET (SELECT count(*) / 2 FROM wb_accounts)
+        LIMIT 1
+        """
+    ))).one()
+    return {
+        "profile_id": row[0],
+        "user_id": row[1],
+        "email": row[2],
+        "account_id": row[3],
+        "account_cursor": encode_cursor(row[4], row[3]),
+        "profile_cursor": encode_cursor(row[5], row[0]),
+    }
+
+
+def cases(session: AsyncSession, keys: dict[str, Any]) -> dict[str, Callable[[], Awaitable[Any]]]:
+    """Запросы, которые выполняют сервисы и аутентификация, с теми же аргументами"""
+    profiles = ProfileDBRepository(session=session)
+    accounts = WBAccountsDBRepo(session=session)
+    users = UserDBRepository(session=session)
+    user_db = UserDatabase(session, User)
+    week_ago = datetime.datetime.now() - datetime.timedelta(days=7)
+
+    return {
+        # аутентификация
+        "auth: user by id": lambda: user_db.get(keys["user_id"]),
+        "auth: user by email": lambda: user_db.get_by_email(keys["email"].upper()),
+        "users: page": lambda: users.get_page(limit=50, cursor=keys["profile_cursor"], columns=USER_READ_COLUMNS),
+        "users: by email prefix": lambda: users.get_page(
+            limit=50,
+            whereclause=UserDBRepository.list_filter(email_prefix=keys["email"][:6]),
+            columns=USER_READ_COLUMNS,
+        ),
+        # ProfileService
+        "profile: by id": lambda: profiles.get_by("id", keys["profile_id"], loader=PROFILE_WITH_USER),
+        "profile: by user_id": lambda: profiles.get_by("user_id", keys["user_id"], loader=PROFILE_WITH_USER),
+        "profile: page": lambda: profiles.get_page(limit=50, cursor=keys["profile_cursor"],
+                                                   loader=PROFILE_WITH_USER),
+        # WBAccountsService
+        "accounts: by profile_id": lambda: accounts.get_by("profile_id", keys["profile_id"], many=True,
+                                                           loader=ACCOUNT_LIST),
+        "accounts: by id": lambda: accounts.get_by("id", keys["account_id"], loader=ACCOUNT_LIST),
+        "accounts: page": lambda: accounts.get_page(limit=50, cursor=keys["account_cursor"],
+                                                    loader=ACCOUNT_LIST),
+        "accounts: wb_token by id": lambda: accounts.get_where(whereclause=WBAccountModel.id == keys["account_id"],
+                                                               columns=[WBAccountModel.wb_token]),
+        "accounts: update by id": lambda: accounts.update_one(keys["account_id"],
+                                                              {"status": WBAccountStatus.ACTIVE.value}),
+        "accounts: bulk update by id": lambda: accounts.bulk_update(
+            [{"id": keys["account_id"], "status": WBAccountStatus.ACTIVE.value}]),
+        # фоновая перепроверка токенов
+        "accounts: due for revalidation": lambda: accounts.revalidation_batch(
+            200, stale_before=week_ago, now=datetime.datetime.now(),
+            retry_before=datetime.datetime.now() - datetime.timedelta(minutes=15)),
+        "accounts: search by token scope": lambda: accounts.get_page(
+            limit=50,
+            whereclause=accounts.json_contains("token_metadata", {"scopes": ["analytics"]}),
+            loader=ACCOUNT_LIST,
+        ),
+        "accounts: search by details path": lambda: accounts.get_page(
+            limit=50,
+            whereclause=accounts.json_path_exists("details", "$.warehouse_id"),
+            loader=ACCOUNT_LIST,
+        ),
+        "accounts: delete by ids": lambda: accounts.delete_by_ids(
+            [keys["account_id"]], whereclause=WBAccountModel.profile_id == keys["profile_id"]),
+    }
+
+
+async def run(users: int, accounts: int, update_baseline: bool, no_baseline: bool) -> int:
+    check_baseline = not update_baseline and not no_baseline
+    if check_baseline and not BASELINE_PATH.exists():
+        print(f"no baseline at {BASELINE_PATH}: create it with --update-baseline "
+              f"or skip the plan comparison with --no-baseline")
+        return 1
+    baseline = json.loads(BASELINE_PATH.read_text()) if check_baseline else {}
+    shapes: dict[str, list[list[str]]] = {}
+    failures = []
+
+    engine = create_async_engine(DATABASE_URL)
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            try:
+                await connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+                await connection.execute(text(f"SET LOCAL search_path TO {SCHEMA}"))
+                await connection.run_sync(Base.metadata.create_all)
+                for statement in SEED_SQL:
+                    await connection.execute(text(statement), {"users": users, "accounts": accounts})
+                keys = await sample(connection)
+
+                recorder = StatementRecorder(connection)
+                # Коммиты репозиториев внутри проверки только освобождают savepoint
+                session = AsyncSession(bind=connection, join_transaction_mode="create_savepoint",
+                                       expire_on_commit=False)
+                for name, call in cases(session, keys).items():
+                    statements = await recorder.capture(call)
+                    shapes[name] = []
+                    for statement, parameters in statements:
+                        plan = await explain(connection, statement, parameters)
+                        shape = plan_shape(plan)
+                        shapes[name].append(shape)
+                        seq_scans = [node["Relation Name"] for node in plan_nodes(plan)
+                                     if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in CHECKED_TABLES]
+                        status = "SEQ SCAN" if seq_scans else "ok"
+                        if seq_scans:
+                            failures.append(f"{name}: Seq Scan on {', '.join(seq_scans)}")
+                        print(f"{name:<34}{status:<10}{plan.get('Total Cost', 0):>10.2f}  {' > '.join(shape)}")
+
+                    if not check_baseline:
+                        continue
+                    if name not in baseline:
+                        failures.append(f"{name}: no baseline plan (see --update-baseline)")
+                    elif baseline[name] != shapes[name]:
+                        failures.append(f"{name}: plan changed\n    was: {baseline[name]}\n    now: {shapes[name]}")
+            finally:
+                await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+    if update_baseline:
+        BASELINE_PATH.write_text(json.dumps(shapes, ensure_ascii=False, indent=2) + "\n")
+        print(f"\nbaseline written to {BASELINE_PATH}")
+    elif no_baseline:
+        print("\nplans were not compared with the baseline (--no-baseline), only sequential scans are checked")
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nall plans ok")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20_000, help="пользователей (и профилей) в тестовых данных")
+    parser.add_argument("--accounts-per-profile", type=int, default=5, help="кабинетов на профиль")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--update-baseline", action="store_true", help="сохранить текущие планы как эталон")
+    group.add_argument("--no-baseline", action="store_true", help="не сравнивать планы с эталоном, только Seq Scan")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.users, args.accounts_per_profile, args.update_baseline, args.no_baseline)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Задержка обычных запросов во время шторма входов.
+
+Пока concurrency клиентов в цикле входят через /api/auth/jwt/login, отдельный клиент с
+постоянной частотой запрашивает /api/v1/profile/current-user. Выводятся p50/p95/p99 этого
+запроса без нагрузки и под нагрузкой, а также число входов и ответов 503 (очередь пула
+хеширования переполнена). Если хеш пароля считается в event loop, каждый вход на десятки
+миллисекунд останавливает все запросы воркера, и p99 растет вместе с числом входов; с
+PasswordHashPool p99 под нагрузкой остается близким к p99 без нее.
+
+Нужен запущенный сервер и существующий пользователь. Для сравнения сервер запускается
+дважды: с PASSWORD_HASH_WORKERS=0 (хеш в event loop) и с настройками по умолчанию.
+Сервер лучше запускать одним воркером, чтобы шторм и замеры попадали в один процесс.
+
+Режим --local не требует сервера и БД: он измеряет задержку event loop (как долго
+просыпается задача, которая спит 10 мс) во время concurrency одновременных хешей в
+event loop и в PasswordHashPool.
+
+Запуск:
+    PASSWORD_HASH_WORKERS=0 poetry run uvicorn src.main:app --workers 1
+    poetry run python -m benchmarks.login_latency_bench --email user@example.com --password secret
+    poetry run python -m benchmarks.login_latency_bench --local
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlencode, urlsplit
+
+from fastapi_users.password import PasswordHelper
+
+
+class HTTPConnection:
+    """Минимальный клиент HTTP/1.1 с keep-alive: в зависимостях проекта нет HTTP клиента"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: dict[str, str] | None = None
+                      ) -> tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("server closed the connection")
+        status = int(status_line.split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, await self.reader.readexactly(length)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def login_body(email: str, password: str) -> bytes:
+    return urlencode({"username": email, "password": password}).encode()
+
+
+async def login(connection: HTTPConnection, email: str, password: str) -> tuple[int, bytes]:
+    return await connection.request("POST", "/api/auth/jwt/login", login_body(email, password),
+                                    {"Content-Type": "application/x-www-form-urlencoded"})
+
+
+async def probe(url: str, token: str, duration: float, rate: float) -> list[float]:
+    """Латентности current-user (мс) с постоянной частотой rate запросов в секунду"""
+    connection = HTTPConnection(url)
+    latencies = []
+    deadline = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status, _ = await connection.request("GET", "/api/v1/profile/current-user",
+                                                 headers={"Authorization": f"Bearer {token}"})
+            if status != 200:
+                raise RuntimeError(f"current-user returned {status}")
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(max(0.0, 1 / rate - (time.perf_counter() - started)))
+    finally:
+        await connection.close()
+    return latencies
+
+
+async def storm(url: str, email: str, password: str, stop: asyncio.Event, counters: dict[int, int]):
+    connection = HTTPConnection(url)
+    try:
+        while not stop.is_set():
+            status, _ = await login(connection, email, password)
+            counters[status] = counters.get(status, 0) + 1
+    finally:
+        await connection.close()
+
+
+def percentiles(latencies: list[float]) -> str:
+    # Если event loop заблокирован почти все время, замеров может быть всего один
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return f"p50 {quantiles[49]:>8.1f}  p95 {quantiles[94]:>8.1f}  p99 {quantiles[98]:>8.1f} ms  (n={len(latencies)})"
+
+
+async def run_http(url: str, email: str, password: str, concurrency: int, duration: float, rate: float):
+    connection = HTTPConnection(url)
+    status, body = await login(connection, email, password)
+    await connection.close()
+    if status != 200:
+        raise SystemExit(f"login failed: {status} {body.decode()}")
+    token = json.loads(body)["access_token"]
+
+    print(f"current-user at {rate:.0f} req/s, {duration:.0f} s per phase")
+    print(f"  idle:                  {percentiles(await probe(url, token, duration, rate))}")
+
+    stop = asyncio.Event()
+    counters: dict[int, int] = {}
+    storms = [asyncio.create_task(storm(url, email, password, stop, counters)) for _ in range(concurrency)]
+    try:
+        latencies = await probe(url, token, duration, rate)
+    finally:
+        stop.set()
+        await asyncio.gather(*storms, return_exceptions=True)
+    print(f"  {concurrency:>3} concurrent logins: {percentiles(latencies)}")
+    print(f"  logins by status: {dict(sorted(counters.items()))}, "
+          f"{sum(counters.values()) / duration:.1f} logins/s")
+
+
+async def loop_lag(duration: float) -> list[float]:
+    """Насколько позже срока просыпается задача, которая спит 10 мс (мс)"""
+    lags = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - started - 0.01) * 1000)
+    return lags
+
+
+async def run_local(concurrency: int, duration: float, workers: int):
+    from src.api.auth.passwords import PasswordHashPool
+
+    helper = PasswordHelper()
+    hashed = helper.hash("benchmark-password")
+    print(f"event loop lag while {concurrency} clients verify passwords, {duration:.0f} s per mode")
+    print(f"  idle:        {percentiles(await loop_lag(duration))}")
+
+    for name, pool in (("event loop", PasswordHashPool(workers=0, max_queue=concurrency)),
+                       (f"pool x{workers}", PasswordHashPool(workers=workers, max_queue=concurrency))):
+        stop = asyncio.Event()
+
+        async def client():
+            while not stop.is_set():
+                await pool.run(helper.verify_and_update, "benchmark-password", hashed)
+                # Без await внутри run (режим event loop) клиенты не отдавали бы управление
+                await asyncio.sleep(0)
+
+        clients = [asyncio.create_task(client()) for _ in range(concurrency)]
+        try:
+            lags = await loop_lag(duration)
+        finally:
+            stop.set()
+            await asyncio.gather(*clients)
+            pool.shutdown()
+        print(f"  {name:<12} {percentiles(lags)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="адрес сервера")
+    parser.add_argument("--email", help="email существующего пользователя")
+    parser.add_argument("--password", help="пароль пользователя")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных входов")
+    parser.add_argument("--duration", type=float, default=10, help="секунд на каждую фазу")
+    parser.add_argument("--rate", type=float, default=50, help="запросов current-user в секунду")
+    parser.add_argument("--local", action="store_true", help="задержка event loop без сервера")
+    parser.add_argument("--workers", type=int, default=2, help="потоков пула в режиме --local")
+    args = parser.parse_args()
+
+    if args.local:
+        asyncio.run(run_local(args.concurrency, args.duration, args.workers))
+    elif not args.email or not args.password:
+        parser.error("--email and --password are required without --local")
+    else:
+        asyncio.run(run_http(args.url, args.email, args.password, args.concurrency, args.duration, args.rate))
+
+
+if __name__ == "__main__":
+    main()
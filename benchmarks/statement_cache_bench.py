@@ -0,0 +1,70 @@
+"""
+Микробенчмарк построения запросов для горячих поисков репозиториев.
+
+Сравнивает CPU на запрос для:
+- adhoc  - select().where().options() собирается на каждый вызов, как в get_where;
+- cached - шаблон из BaseDBRepository.get_by (строится один раз).
+
+В обоих случаях считается и ключ кэша скомпилированных запросов, который SQLAlchemy
+вычисляет при каждом execute. Отдельно показана полная компиляция без кэша.
+БД не нужна.
+
+Запуск:
+    poetry run python -m benchmarks.statement_cache_bench
+"""
+import timeit
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import selectinload
+
+from wms_services.models import ProfileModel, WBAccountModel
+from wms_services.repositories import ProfileDBRepository, WBAccountsDBRepo
+
+NUMBER = 20_000
+DIALECT = postgresql.asyncpg.dialect()
+
+
+def adhoc(model, column, value, relations=()):
+    statement = select(model).where(getattr(model, column) == value)
+    for relation in relations:
+        statement = statement.options(selectinload(relation))
+    return statement
+
+
+def measure(name: str, func) -> float:
+    per_call = timeit.timeit(func, number=NUMBER) / NUMBER * 1e6
+    print(f"{name:<48}{per_call:>10.2f} µs")
+    return per_call
+
+
+def main():
+    profile_repo = ProfileDBRepository(session=None)
+    account_repo = WBAccountsDBRepo(session=None)
+
+    cases = [
+        ("profile by user_id", profile_repo, ProfileModel, "user_id", ()),
+        ("accounts by profile_id", account_repo, WBAccountModel, "profile_id", ()),
+        ("account by id (+profile)", account_repo, WBAccountModel, "id", (WBAccountModel.profile,)),
+    ]
+
+    for title, repo, model, column, relations in cases:
+        print(title)
+        before = measure(
+            "  adhoc:  build + cache key",
+            lambda: adhoc(model, column, uuid.uuid4(), relations)._generate_cache_key(),
+        )
+        after = measure(
+            "  cached: lookup + cache key",
+            lambda: repo._lookup_statement(column, relations)._generate_cache_key(),
+        )
+        measure(
+            "  adhoc:  build + full compile (no SQL cache)",
+            lambda: adhoc(model, column, uuid.uuid4(), relations).compile(dialect=DIALECT),
+        )
+        print(f"  saved per request: {before - after:.2f} µs ({before / after:.0f}x)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Сравнение первичных ключей uuid4 и uuid7 на вставке.
+
+Для каждой версии создается таблица с первичным ключом uuid (как у моделей Base) и
+заполняется пачками INSERT ... SELECT unnest(...) с ключами, сгенерированными в Python,
+как это делает приложение. Выводятся время и скорость вставки, размер индекса первичного
+ключа и таблицы. Случайные uuid4 раскладываются по всему btree (разбиения страниц,
+полупустые листья), uuid7 дописываются в его правый край.
+
+Отдельно без БД измеряется стоимость генерации ключа.
+
+Нужна БД PostgreSQL из настроек приложения (.env). Таблицы uuid_bench_v4/uuid_bench_v7
+удаляются в конце.
+
+Запуск:
+    poetry run python -m benchmarks.uuid7_bench
+    poetry run python -m benchmarks.uuid7_bench --rows 1000000 --batch 5000
+"""
+import argparse
+import asyncio
+import time
+import timeit
+import uuid
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.config.loader import DATABASE_URL
+from wms_services.utils.uuid7 import uuid7
+
+GENERATORS: dict[str, Callable[[], uuid.UUID]] = {
+    "v4": uuid.uuid4,
+    "v7": uuid7,
+}
+
+
+def measure_generation(number: int = 200_000):
+    print("key generation (no DB)")
+    for name, generator in GENERATORS.items():
+        per_call = timeit.timeit(generator, number=number) / number * 1e6
+        print(f"  {name}: {per_call:.2f} µs per key")
+    print()
+
+
+async def measure_insert(connection: AsyncConnection, name: str, generator, rows: int, batch: int) -> dict:
+    table = f"uuid_bench_{name}"
+    await connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    await connection.execute(text(
+        f"CREATE TABLE {table} (id uuid PRIMARY KEY, created_at timestamp NOT NULL DEFAULT now(), payload text)"
+    ))
+    await connection.commit()
+
+    statement = text(f"INSERT INTO {table} (id, payload) SELECT unnest(CAST(:ids AS uuid[])), 'x'")
+    started = time.perf_counter()
+    for offset in range(0, rows, batch):
+        ids = [generator() for _ in range(min(batch, rows - offset))]
+        await connection.execute(statement, {"ids": ids})
+        await connection.commit()
+    elapsed = time.perf_counter() - started
+
+    sizes = (await connection.execute(text(
+        f"SELECT pg_relation_size('{table}_pkey'), pg_relation_size('{table}')"
+    ))).one()
+    await connection.execute(text(f"DROP TABLE {table}"))
+    await connection.commit()
+    return {"seconds": elapsed, "rows_per_second": rows / elapsed, "index_bytes": sizes[0], "table_bytes": sizes[1]}
+
+
+async def run(rows: int, batch: int):
+    measure_generation()
+
+    engine = create_async_engine(DATABASE_URL)
+    results = {}
+    try:
+        async with engine.connect() as connection:
+            for name, generator in GENERATORS.items():
+                results[name] = await measure_insert(connection, name, generator, rows, batch)
+    finally:
+        await engine.dispose()
+
+    print(f"insert {rows} rows in batches of {batch}")
+    print(f"  {'':<4}{'seconds':>10}{'rows/s':>12}{'pkey MB':>10}{'table MB':>10}")
+    for name, result in results.items():
+        print(f"  {name:<4}{result['seconds']:>10.2f}{result['rows_per_second']:>12.0f}"
+              f"{result['index_bytes'] / 2**20:>10.1f}{result['table_bytes'] / 2**20:>10.1f}")
+
+    v4, v7 = results["v4"], results["v7"]
+    print(f"\n  v7 vs v4: {v7['rows_per_second'] / v4['rows_per_second']:.2f}x throughput, "
+          f"pkey {v7['index_bytes'] / v4['index_bytes']:.2f}x size")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="строк в каждой таблице")
+    parser.add_argument("--batch", type=int, default=5_000, help="строк в одном INSERT")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.batch))
+
+
+if __name__ == "__main__":
+    main()
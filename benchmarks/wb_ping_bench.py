@@ -0,0 +1,130 @@
+"""
+Латентность массовых пингов токенов: отдельный клиент на каждую проверку против общего пула.
+
+Так проверка токена работала раньше (WildberriesMarketplaceClient на каждый вызов): каждый ping
+открывает новое TCP соединение и заново проходит TLS рукопожатие. С HTTPClientPool проверки
+берут соединения из пула с keep-alive (и HTTP/2, если сервер его поддерживает), и рукопожатие
+происходит один раз на соединение. Выводятся p50/p95/p99 одного ping и общее время пачки.
+
+По умолчанию пингуется API Wildberries с переданным токеном. Режим --local поднимает
+локальный HTTPS сервер с самоподписанным сертификатом (нужен openssl) и не требует токена и
+сети: рукопожатие по loopback дешевле, чем до API маркетплейса, поэтому разница там меньше.
+
+Запуск:
+    poetry run python -m benchmarks.wb_ping_bench --token <токен кабинета>
+    poetry run python -m benchmarks.wb_ping_bench --local
+"""
+import argparse
+import asyncio
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from wms_services.utils.http_pool import HTTPClientPool, WBTokenClient
+
+
+async def fresh_ping(url: str, token: str, verify: ssl.SSLContext | bool) -> int:
+    async with httpx.AsyncClient(verify=verify, timeout=10) as client:
+        return (await client.get(url, headers={"Authorization": token})).status_code
+
+
+async def pooled_ping(pool: HTTPClientPool, url: str, token: str) -> int:
+    return (await pool.for_token(token).request("GET", url)).status_code
+
+
+async def measure(ping, pings: int, concurrency: int) -> tuple[list[float], float, dict[int, int]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            status = await ping()
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(pings)))
+    return latencies, time.perf_counter() - started, statuses
+
+
+def percentiles(latencies: list[float]) -> str:
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return f"p50 {quantiles[49]:>7.1f}  p95 {quantiles[94]:>7.1f}  p99 {quantiles[98]:>7.1f} ms"
+
+
+async def run(url: str, token: str, pings: int, concurrency: int, verify: ssl.SSLContext | bool):
+    pool = HTTPClientPool(max_connections=concurrency, max_per_host=concurrency, keepalive_expiry=30,
+                          timeout=10, verify=verify)
+    await pool.start()
+    try:
+        modes = (("client per ping", lambda: fresh_ping(url, token, verify)),
+                 (f"shared pool{' (h2)' if pool.http2 else ''}", lambda: pooled_ping(pool, url, token)))
+        print(f"{pings} pings of {url}, {concurrency} concurrent")
+        for name, ping in modes:
+            latencies, seconds, statuses = await measure(ping, pings, concurrency)
+            print(f"  {name:<18} {percentiles(latencies)}  total {seconds:>6.2f} s  statuses {statuses}")
+        print(f"  pool http versions: {pool.stats()['http_versions']}")
+    finally:
+        await pool.aclose()
+
+
+async def serve_ping(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Минимальный HTTP/1.1 сервер с keep-alive: на любой запрос - 200 как у /ping"""
+    body = b'{"TS":"2024-01-01T00:00:00Z","Status":"OK"}'
+    try:
+        while True:
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                pass
+            if not line:
+                break
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+    except (ConnectionError, ssl.SSLError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_local(pings: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = Path(directory, "cert.pem"), Path(directory, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+                        "-keyout", str(key), "-out", str(cert)], check=True, capture_output=True)
+        server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_context.load_cert_chain(cert, key)
+        client_context = ssl.create_default_context(cafile=str(cert))
+
+        server = await asyncio.start_server(serve_ping, "localhost", 0, ssl=server_context)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            await run(f"https://localhost:{port}/ping", "benchmark-token", pings, concurrency, client_context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token", help="токен кабинета ВБ")
+    parser.add_argument("--url", default=WBTokenClient.COMMON_PING_URL, help="адрес ping")
+    parser.add_argument("--pings", type=int, default=200, help="пингов в каждом режиме")
+    parser.add_argument("--concurrency", type=int, default=10, help="одновременных пингов")
+    parser.add_argument("--local", action="store_true", help="локальный HTTPS сервер вместо API ВБ")
+    args = parser.parse_args()
+
+    if args.local:
+        asyncio.run(run_local(args.pings, args.concurrency))
+    elif not args.token:
+        parser.error("--token is required without --local")
+    else:
+        asyncio.run(run(args.url, args.token, args.pings, args.concurrency, True))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import uuid
 from typing import Optional
 
 import jwt
+from fastapi_users import exceptions
 from fastapi_users.authentication import JWTStrategy, AuthenticationBackend, BearerTransport
 from jwt import ExpiredSignatureError, InvalidTokenError
 
@@ -21,12 +22,30 @@ class CustomJWTStrategy(JWTStrategy):
             user_id = payload.get("subject", {}).get("sub")
 
             if user_id:
-                user = await user_manager.get(uuid.UUID(user_id, version=4))
-                return user
+                # Без version=4: он перезаписывает биты версии и испортил бы id uuid7
+                return await self.get_principal(uuid.UUID(user_id), user_manager)
             return None
-        except (jwt.PyJWTError, ValueError):
+        except (jwt.PyJWTError, ValueError, exceptions.UserNotExists):
             return None
 
+    @staticmethod
+    async def get_principal(user_id: uuid.UUID, user_manager) -> User:
+        """
+        Пользователь с профилем из кэша процесса или из БД (с последующим кэшированием).
+        Копия из кэша переносится в сессию запроса без запроса к БД, как в EntityCache
+        """
+        from src.config.loader import principal_cache
+
+        key = principal_cache.key(user_id)
+        version = principal_cache.version
+        cached = principal_cache.get_principal(key)
+        if cached is not None:
+            return await user_manager.user_db.session.merge(cached, load=False)
+
+        user = await user_manager.get(user_id)
+        principal_cache.set_principal(key, user, version)
+        return user
+
 
 def get_jwt_strategy() -> JWTStrategy:
     return CustomJWTStrategy(secret=SECRET, lifetime_seconds=config.JWT_ACCESS_LIFETIME_SECONDS)
@@ -14,9 +14,11 @@ async def create_db_and_tables():
 
 async def get_user_by_id(user_id: uuid.UUID):
     from wms_services.models import User
+    from wms_services.repositories.loaders import AUTH_PRINCIPAL
 
     async with async_session_maker() as session:
-        stmt = select(User).filter(User.id == user_id)
+        # С профилем: он нужен для утверждений access токена (access_token_claims)
+        stmt = select(User).filter(User.id == user_id).options(*AUTH_PRINCIPAL.options)
         result = await session.execute(stmt)
 
         user = result.scalar_one_or_none()
@@ -26,15 +28,48 @@ async def get_user_by_id(user_id: uuid.UUID):
         return user
 
 
-async def get_users() -> Sequence:
+async def get_user_token_state(user_id: uuid.UUID):
+    """Версия и активность пользователя для проверки refresh токена (None, если пользователь удален)"""
     from wms_services.models import User
 
-    """Список пользователей"""
+    async with async_session_maker() as session:
+        stmt = select(User.token_version, User.is_active).where(User.id == user_id)
+        return (await session.execute(stmt)).one_or_none()
+
+
+async def get_users(limit: int,
+                    cursor: str | None = None,
+                    columns: Sequence | None = None,
+                    role: str | None = None,
+                    is_active: bool | None = None,
+                    email_prefix: str | None = None) -> tuple[Sequence, str | None]:
+    """Страница списка пользователей (строки columns, без связей) и курсор следующей страницы"""
+    from wms_services.exceptions.pagination_exceptions import InvalidCursorError
+    from wms_services.repositories import UserDBRepository
+
     async with async_session_maker() as session:
         try:
-            stmt = select(User)
-            result = await session.execute(stmt)
-            users = result.scalars().all()
-            return users
+            return await UserDBRepository(session=session).get_page(
+                limit=limit,
+                cursor=cursor,
+                whereclause=UserDBRepository.list_filter(role, is_active, email_prefix),
+                columns=columns,
+            )
+        except InvalidCursorError:
+            raise
         except Exception as e:
             raise Exception(f"Error fetching users: {str(e)}")
+
+
+async def count_users(mode,
+                      role: str | None = None,
+                      is_active: bool | None = None,
+                      email_prefix: str | None = None) -> int:
+    """Общее количество пользователей для списка с теми же фильтрами (mode - CountMode)"""
+    from wms_services.repositories import UserDBRepository
+
+    async with async_session_maker() as session:
+        return await UserDBRepository(session=session).count(
+            whereclause=UserDBRepository.list_filter(role, is_active, email_prefix),
+            mode=mode,
+        )
@@ -1,15 +1,22 @@
 import uuid
 from collections.abc import AsyncGenerator
-from typing import Optional
+from typing import Any, Optional
 
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, UUIDIDMixin
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import BaseUserManager, UUIDIDMixin, exceptions, schemas
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from loguru import logger
+from sqlalchemy import Select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.config import config
-from wms_services.models import User, ProfileModel
+from wms_services.models import User, ProfileModel, WBAccountModel
+from wms_services.repositories.cache import row_tags
+from wms_services.repositories.cache_sync import apply_invalidation, publish_invalidation
+
+# Удаление пользователя каскадно удаляет его профиль и кабинеты в БД
+USER_CASCADE_TABLES = tuple(model.__table__.name for model in (User, ProfileModel, WBAccountModel))
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
@@ -25,34 +32,177 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
 
 SECRET = config.JWT_SECRET
 
+# Поля пользователя, которые несет access токен (или которые отзывают его): их изменение
+# увеличивает User.token_version, и прежние токены перестают приниматься
+TOKEN_VERSION_FIELDS = ("password", "is_active", "is_superuser", "role")
+
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    @staticmethod
+    async def run_password_hasher(func, *args):
+        """Хеширование и проверка пароля в пуле потоков (см. PasswordHashPool)"""
+        from src.config.loader import password_hash_pool
+
+        return await password_hash_pool.run(func, *args)
+
+    async def create(
+            self,
+            user_create: schemas.UC,
+            safe: bool = False,
+            request: Optional[Request] = None,
+    ) -> User:
+        # Как BaseUserManager.create, но хеш пароля считается вне event loop
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await self.run_password_hasher(self.password_helper.hash, password)
+
+        created_user = await self.user_db.create(user_dict)
+
+        await self.on_after_register(created_user, request)
+
+        return created_user
+
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> Optional[User]:
+        # Как BaseUserManager.authenticate, но хеш пароля считается вне event loop
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Хеш и для несуществующего пользователя: время ответа не выдает, есть ли email
+            await self.run_password_hasher(self.password_helper.hash, credentials.password)
+            return None
+
+        verified, updated_password_hash = await self.run_password_hasher(
+            self.password_helper.verify_and_update, credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+
+        return user
+
     async def on_after_register(self, user: User, request: Optional[Request] = None):
-        from src.config.loader import async_session_maker
+        from src.config.loader import async_session_maker, entity_cache
 
         async with async_session_maker() as session:
             profile = ProfileModel(user_id=user.id)
 
             session.add(profile)
 
+            # Пользователь мог уже попасть в кэш без профиля
+            tags = row_tags(ProfileModel, {"user_id": user.id})
+            await publish_invalidation(session, entity_cache, rows=tags)
             await session.commit()
+            apply_invalidation(entity_cache, rows=tags)
 
         logger.info(f"User {user.id} has registered.")
         logger.info(f"Profile for user {user.id} has added with ID {profile.id}.")
 
+    @staticmethod
+    def invalidate_user_caches(user: User, deleted: bool = False):
+        """
+        Сброс в кэше этого воркера сразу после записи: профили в кэше сущностей и пользователи
+        для аутентификации помечены строкой пользователя. Остальным воркерам тот же сброс
+        рассылает UserDatabase в транзакции записи
+        """
+        from src.config.loader import entity_cache
+
+        if deleted:
+            apply_invalidation(entity_cache, tables=USER_CASCADE_TABLES)
+        else:
+            apply_invalidation(entity_cache, rows=row_tags(User, {"id": user.id}))
+
+    @staticmethod
+    def note_token_version(user: User):
+        from src.config.loader import token_versions
+
+        token_versions.note(user.id, user.token_version)
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        # Через _update проходят и update, и reset_password
+        if any(
+                field == "password" and value is not None
+                or field != "password" and getattr(user, field) != value
+                for field, value in update_dict.items()
+                if field in TOKEN_VERSION_FIELDS
+        ):
+            update_dict = {**update_dict, "token_version": user.token_version + 1}
+
+        password = update_dict.get("password")
+        if password is not None:
+            # Хеш считается здесь, вне event loop: базовый _update получит готовый hashed_password
+            await self.validate_password(password, user)
+            update_dict = {key: value for key, value in update_dict.items() if key != "password"}
+            update_dict["hashed_password"] = await self.run_password_hasher(self.password_helper.hash, password)
+        return await super()._update(user, update_dict)
+
+    async def on_after_update(self, user: User, update_dict: dict, request: Optional[Request] = None):
+        # В том числе деактивация (is_active) и смена прав (is_superuser)
+        self.invalidate_user_caches(user)
+        self.note_token_version(user)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        from src.config.loader import token_versions
+
+        self.invalidate_user_caches(user, deleted=True)
+        token_versions.revoke(user.id)
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        self.invalidate_user_caches(user)
+
+    async def on_after_reset_password(self, user: User, request: Optional[Request] = None):
+        self.invalidate_user_caches(user)
+        self.note_token_version(user)
+
     async def on_after_request_verify(
             self, user: User, token: str, request: Optional[Request] = None
     ):
         logger.info(f"Verification requested for user {user.id}. Verification token: {token}")
 
 
+class UserDatabase(SQLAlchemyUserDatabase):
+    """
+    Загружает пользователя по профилю AUTH_PRINCIPAL: с профилем, без кабинетов.
+
+    Изменение и удаление пользователя рассылают сброс кэшей всем воркерам (NOTIFY в той же
+    транзакции): деактивация, смена прав или пароля действуют во всех воркерах после коммита
+    """
+
+    async def update(self, user: User, update_dict: dict[str, Any]) -> User:
+        from src.config.loader import entity_cache
+
+        await publish_invalidation(self.session, entity_cache, rows=row_tags(User, {"id": user.id}))
+        return await super().update(user, update_dict)
+
+    async def delete(self, user: User) -> None:
+        from src.config.loader import entity_cache
+
+        await publish_invalidation(self.session, entity_cache, tables=USER_CASCADE_TABLES)
+        await super().delete(user)
+
+    async def _get_user(self, statement: Select) -> Optional[User]:
+        from wms_services.repositories.loaders import AUTH_PRINCIPAL
+
+        return await super()._get_user(statement.options(*AUTH_PRINCIPAL.options))
+
+
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
     from wms_services.models import User
 
-    return SQLAlchemyUserDatabase(session, User)
+    return UserDatabase(session, User)
 
 
 async def get_user_manager(user_db=Depends(get_user_db)):
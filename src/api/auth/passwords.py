@@ -0,0 +1,98 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, TypeVar
+
+from wms_services.exceptions.auth_exceptions import PasswordHashingBusyError
+
+__all__ = ["PasswordHashPool"]
+
+T = TypeVar("T")
+
+
+class PasswordHashPool:
+    """
+    Хеширование и проверка паролей вне event loop.
+
+    argon2 и bcrypt (pwdlib в fastapi-users) отпускают GIL на время вычисления, поэтому
+    достаточно пула потоков: пароль не сериализуется в другой процесс, а остальные запросы
+    воркера не ждут хеш. Одновременно считается не больше workers хешей, ожидающих - не больше
+    max_queue, остальные сразу получают PasswordHashingBusyError (503), а не копятся в очереди.
+
+    workers=0 - прежнее поведение: хеш считается прямо в event loop (для сравнения в бенчмарке).
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash") if workers else None
+        self._semaphore = asyncio.Semaphore(workers or 1)
+        self.waiting = 0
+        self.max_waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._executor is None:
+            return func(*args)
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingBusyError()
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self.wait_seconds += started_at - queued_at
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.run_seconds += time.perf_counter() - started_at
+            self._semaphore.release()
+
+    async def map(self, func: Callable[[Any], T], items: Iterable[Any]) -> list[T]:
+        """
+        func для каждого элемента (например, хеши паролей массового импорта) на всех потоках пула.
+
+        В очередь одновременно ставится не больше workers вызовов, поэтому пачка не занимает
+        очередь целиком: входы пользователей встают в нее между вызовами пачки
+        """
+        items = list(items)
+        results: list[Any] = [None] * len(items)
+        positions = iter(range(len(items)))
+
+        async def worker():
+            for position in positions:
+                results[position] = await self.run(func, items[position])
+
+        await asyncio.gather(*(worker() for _ in range(max(self.workers, 1))))
+        return results
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.wait_seconds / self.completed * 1000 if self.completed else 0.0,
+            "avg_run_ms": self.run_seconds / self.completed * 1000 if self.completed else 0.0,
+        }
@@ -0,0 +1,286 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import jwt
+from fastapi import Depends, HTTPException
+from loguru import logger
+from sqlalchemy import select
+from starlette import status
+
+from src.api.auth.auth import bearer_transport, get_jwt_strategy
+from src.config import config
+from wms_services.models import User
+
+__all__ = [
+    "Principal",
+    "TokenVersions",
+    "access_token_claims",
+    "refresh_token_claims",
+    "refresh_access_claims",
+    "is_refresh_token_current",
+    "current_principal",
+    "sync_token_versions",
+]
+
+# Версия пользователя, удаленного в этом процессе: любые его токены недействительны
+_DELETED = -1
+# Утверждения access токена в режиме AUTH_STATELESS (subject в fastapi_jwt)
+ACCESS_TOKEN_CLAIMS = ("sub", "profile_id", "role", "is_active", "is_superuser", "ver")
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Аутентифицированный пользователь без обращения к БД: то, что нужно роутерам для проверки прав"""
+    id: uuid.UUID
+    profile_id: Optional[uuid.UUID]
+    role: str
+    is_active: bool
+    is_superuser: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            profile_id=user.profile.id if user.profile is not None else None,
+            role=user.role,
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+            token_version=user.token_version,
+        )
+
+    @classmethod
+    def from_claims(cls, subject: dict[str, Any]) -> "Principal":
+        """:raises KeyError, ValueError: в токене нет полного набора утверждений"""
+        profile_id = subject["profile_id"]
+        return cls(
+            id=uuid.UUID(subject["sub"]),
+            profile_id=uuid.UUID(profile_id) if profile_id else None,
+            role=subject["role"],
+            is_active=bool(subject["is_active"]),
+            is_superuser=bool(subject["is_superuser"]),
+            token_version=int(subject["ver"]),
+        )
+
+
+def access_token_claims(user: User) -> dict[str, Any]:
+    """
+    Утверждения access токена (subject в fastapi_jwt). Пользователь должен быть загружен
+    с профилем (AUTH_PRINCIPAL). Без AUTH_STATELESS в токене только sub
+    """
+    claims = {"sub": str(user.id)}
+    if config.AUTH_STATELESS:
+        principal = Principal.from_user(user)
+        claims.update(
+            profile_id=str(principal.profile_id) if principal.profile_id else None,
+            role=principal.role,
+            is_active=principal.is_active,
+            is_superuser=principal.is_superuser,
+            ver=principal.token_version,
+        )
+    return claims
+
+
+def refresh_token_claims(user: User) -> dict[str, Any]:
+    """
+    Утверждения refresh токена: те же, что у access токена, и всегда версия пользователя.
+    По ним /refresh выдает новый access токен без запроса к БД (см. refresh_access_claims)
+    """
+    return {**access_token_claims(user), "ver": user.token_version}
+
+
+class TokenVersions:
+    """
+    Известные процессу актуальные версии пользователей (User.token_version) для проверки
+    токенов без БД: токен с версией ниже известной отклоняется до истечения его срока.
+
+    Версии попадают сюда из хуков UserManager (изменение в этом процессе - сразу) и из
+    sync_token_versions, который раз в interval секунд одним запросом перечитывает версии всех
+    пользователей, чьи токены процесс видел (изменения в других воркерах и удаление).
+    Пользователь, которого процесс видит впервые, пропускается по токену до ближайшей сверки.
+    Размер ограничен LRU: вытесненный пользователь снова становится "впервые увиденным".
+
+    Это же множество отзыва для refresh токенов: удаление и деактивация увеличивают версию
+    (или помечают пользователя удаленным), и refresh токен прежней версии не принимается.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._versions: OrderedDict[uuid.UUID, Optional[int]] = OrderedDict()
+        self.rejected = 0
+        self.syncs = 0
+        self.refresh_hits = 0
+        self.refresh_misses = 0
+
+    def check(self, user_id: uuid.UUID, version: int) -> Optional[bool]:
+        """True - версия актуальна, False - токен отозван, None - версия пользователя неизвестна"""
+        known = self._versions.get(user_id)
+        if known is None:
+            return None
+
+        self._versions.move_to_end(user_id)
+        if known == _DELETED or version < known:
+            self.rejected += 1
+            return False
+        return True
+
+    def is_current(self, user_id: uuid.UUID, version: int) -> bool:
+        current = self.check(user_id, version)
+        if current is None:
+            if user_id not in self._versions:
+                self._remember(user_id, None)
+            return True
+        return current
+
+    def note(self, user_id: uuid.UUID, version: int):
+        known = self._versions.get(user_id)
+        if known != _DELETED:
+            self._remember(user_id, version if known is None else max(known, version))
+
+    def revoke(self, user_id: uuid.UUID):
+        self._remember(user_id, _DELETED)
+
+    def user_ids(self) -> list[uuid.UUID]:
+        return [user_id for user_id, version in self._versions.items() if version != _DELETED]
+
+    def _remember(self, user_id: uuid.UUID, version: Optional[int]):
+        self._versions[user_id] = version
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_size:
+            self._versions.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": len(self._versions),
+            "max_size": self.max_size,
+            "rejected": self.rejected,
+            "syncs": self.syncs,
+            "refresh_hits": self.refresh_hits,
+            "refresh_misses": self.refresh_misses,
+        }
+
+
+async def sync_token_versions(interval: float):
+    """Фоновая сверка TokenVersions с БД (запускается при старте приложения)"""
+    from src.config.loader import async_session_maker, token_versions
+
+    while True:
+        await asyncio.sleep(interval)
+        user_ids = token_versions.user_ids()
+        if not user_ids:
+            continue
+        try:
+            async with async_session_maker() as session:
+                rows = (await session.execute(
+                    select(User.id, User.token_version).where(User.id.in_(user_ids))
+                )).all()
+        except Exception as e:
+            logger.warning(f"Token versions sync failed: {e}")
+            continue
+
+        found = {user_id: version for user_id, version in rows}
+        for user_id in user_ids:
+            if user_id in found:
+                token_versions.note(user_id, found[user_id])
+            else:
+                token_versions.revoke(user_id)
+        token_versions.syncs += 1
+
+
+async def is_refresh_token_current(subject: dict[str, Any]) -> bool:
+    """
+    Не отозван ли refresh токен с версией (refresh_token_claims): пользователь не удален,
+    не деактивирован и его версия не выросла (смена пароля, роли, прав).
+
+    Версия пользователя берется из TokenVersions, БД читается только при промахе: одна строка,
+    только версия и активность, без пользователя со связями.
+    """
+    from src.api.auth.database import get_user_token_state
+    from src.config.loader import token_versions
+
+    user_id, version = uuid.UUID(subject["sub"]), int(subject["ver"])
+    current = token_versions.check(user_id, version)
+    if current is not None:
+        token_versions.refresh_hits += 1
+        return current
+
+    token_versions.refresh_misses += 1
+    state = await get_user_token_state(user_id)
+    if state is None:
+        token_versions.revoke(user_id)
+        return False
+    token_versions.note(user_id, state.token_version)
+    return bool(state.is_active) and bool(token_versions.check(user_id, version))
+
+
+def refresh_access_claims(subject: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """
+    Утверждения нового access токена из subject действующего refresh токена или None, если
+    их там недостаточно (токен выдан до включения AUTH_STATELESS) и пользователя нужно загрузить
+    """
+    if not config.AUTH_STATELESS:
+        return {"sub": subject["sub"]}
+    # Версия актуальна, значит и роль, права и профиль в refresh токене актуальны
+    if not all(key in subject for key in ACCESS_TOKEN_CLAIMS):
+        return None
+    return {key: subject[key] for key in ACCESS_TOKEN_CLAIMS}
+
+
+def _decode_stateless(token: str) -> Optional[Principal]:
+    """Principal из подписанного access токена или None, если в токене только sub (выдан до AUTH_STATELESS)"""
+    from src.config.loader import token_versions
+
+    try:
+        payload = jwt.decode(token, config.JWT_SECRET, algorithms=["HS256"])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    # refresh токен несет те же утверждения и версию, но живет дольше и как access не принимается
+    if payload.get("type") != "access":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    subject = payload.get("subject") or {}
+    if "ver" not in subject:
+        return None
+    try:
+        principal = Principal.from_claims(subject)
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    if not token_versions.is_current(principal.id, principal.token_version):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return principal
+
+
+def current_principal(active: bool = False, superuser: bool = False):
+    """
+    Зависимость, аналогичная fastapi_users.current_user, но возвращающая Principal.
+
+    В режиме AUTH_STATELESS пользователь берется из проверенного access токена без запроса
+    к БД. Иначе (и для токенов без утверждений) - через стратегию аутентификации с БД.
+    """
+    from src.config.loader import fastapi_users
+
+    async def dependency(
+            token: Optional[str] = Depends(bearer_transport.scheme),
+            user_manager=Depends(fastapi_users.get_user_manager),
+    ) -> Principal:
+        if token is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+        principal = _decode_stateless(token) if config.AUTH_STATELESS else None
+        if principal is None:
+            user = await get_jwt_strategy().read_token(token, user_manager)
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+            principal = Principal.from_user(user)
+
+        if active and not principal.is_active:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        if superuser and not principal.is_superuser:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+        return principal
+
+    return dependency
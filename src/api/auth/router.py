@@ -1,18 +1,33 @@
 from datetime import timedelta
-from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_jwt import JwtAccessBearer, JwtRefreshBearer
 from fastapi_users.manager import BaseUserManager
+from sqlalchemy.exc import IntegrityError
 
 
 from src.api.auth.auth import decode_token
-from src.api.auth.database import get_user_by_id, get_users
+from src.api.auth.database import get_user_by_id, get_users, count_users
+from src.api.auth.principal import (
+    Principal,
+    current_principal,
+    access_token_claims,
+    refresh_token_claims,
+    refresh_access_claims,
+    is_refresh_token_current,
+)
 from src.api.auth.schemas import UserRead
+from src.api.pagination import PaginationParams, get_pagination_params
+from src.api.services_depends import get_user_import_service
 from src.config import config
-from src.config.loader import fastapi_users
+from src.config.loader import fastapi_users, token_versions, password_hash_pool
+from wms_services.exceptions.pagination_exceptions import InvalidCursorError
+from wms_services.exceptions.user_exceptions import UserImportError, UserImportFileError
 from wms_services.models import User
+from wms_services.schemas import PageSchema, UserImportResultSchema
+from wms_services.services import UserImportService
+from wms_services.utils import read_table
 
 router = APIRouter(
     prefix="/auth/jwt",
@@ -37,9 +52,11 @@ async def login(
     if user is None:
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    access_token = access_security.create_access_token({"sub": str(user.id)},
+    # Версия пользователя известна, и первый /refresh в этом воркере обойдется без БД
+    token_versions.note(user.id, user.token_version)
+    access_token = access_security.create_access_token(access_token_claims(user),
                                                        timedelta(seconds=config.JWT_ACCESS_LIFETIME_SECONDS))
-    refresh_token = refresh_security.create_refresh_token({"sub": str(user.id)},
+    refresh_token = refresh_security.create_refresh_token(refresh_token_claims(user),
                                                           timedelta(seconds=config.JWT_REFRESH_LIFETIME_SECONDS))
 
     return {
@@ -56,29 +73,80 @@ async def refresh_token(refresh_token: str):
     except Exception as e:
         raise HTTPException(status_code=401, detail=e)
 
-    user_id = payload['subject']['sub']
-
-    try:
-        user = await get_user_by_id(user_id)
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=e)
-
-    new_access_token = access_security.create_access_token({"sub": str(user.id)},
+    if payload.get('type') != 'refresh':
+        raise HTTPException(status_code=401, detail="Invalid token type")
+
+    subject = payload['subject']
+    claims = None
+    if 'ver' in subject:
+        # Быстрый путь: отзыв проверяется по TokenVersions, утверждения берутся из самого токена
+        if not await is_refresh_token_current(subject):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        claims = refresh_access_claims(subject)
+
+    if claims is None:
+        # Токен выдан до появления версий или без утверждений AUTH_STATELESS
+        try:
+            user = await get_user_by_id(subject['sub'])
+        except Exception as e:
+            raise HTTPException(status_code=401, detail=e)
+        claims = access_token_claims(user)
+
+    new_access_token = access_security.create_access_token(claims,
                                                            timedelta(seconds=config.JWT_ACCESS_LIFETIME_SECONDS))
 
     return {"access_token": new_access_token, "token_type": "bearer"}
 
-@users_router.get('/all', response_model=List[UserRead])
-async def get_users_router(user: User = Depends(fastapi_users.current_user())):
-    users = await get_users()
-    return [UserRead(
-        id=user.id,
-        email=user.email,
-        first_name=user.first_name,
-        second_name=user.second_name,
-        last_name=user.last_name,
-        role=user.role,
-        is_active=user.is_active,
-        is_superuser=user.is_superuser,
-        is_verified=user.is_verified,
-    ) for user in users]
+# Только колонки UserRead: без ORM-объектов пользователя, профиля и кабинетов
+USER_READ_COLUMNS = [getattr(User, name) for name in UserRead.model_fields]
+
+
+@users_router.get('/all', response_model=PageSchema[UserRead])
+async def get_users_router(
+        pagination: PaginationParams = Depends(get_pagination_params),
+        role: str | None = Query(None, description="Только пользователи с ролью"),
+        is_active: bool | None = Query(None, description="Только активные (true) или неактивные (false)"),
+        email_prefix: str | None = Query(None, min_length=1, max_length=320,
+                                         description="Начало email (без учета регистра)"),
+        user: Principal = Depends(current_principal())
+):
+    filters = {"role": role, "is_active": is_active, "email_prefix": email_prefix}
+    try:
+        users, next_cursor = await get_users(limit=pagination.limit, cursor=pagination.cursor,
+                                             columns=USER_READ_COLUMNS, **filters)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    total = await count_users(pagination.count, **filters) if pagination.count is not None else None
+
+    return PageSchema[UserRead](items=[UserRead.model_validate(row) for row in users],
+                                next_cursor=next_cursor, total=total, total_mode=pagination.count)
+
+
+@users_router.post('/import', response_model=UserImportResultSchema)
+async def import_users_router(
+        file: UploadFile = File(..., description="CSV или XLSX с заголовками email, password, first_name, "
+                                                 "second_name, last_name и необязательным role"),
+        user_import_service: UserImportService = Depends(get_user_import_service),
+        user_manager: BaseUserManager = Depends(fastapi_users.get_user_manager),
+        user: Principal = Depends(current_principal(active=True, superuser=True)),
+):
+    """Массовое создание пользователей с профилями из файла (суперпользователь).
+    Некорректный файл не создает никого, пользователи с занятыми email пропускаются"""
+    try:
+        rows = read_table(file.filename, await file.read())
+    except UserImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > config.USER_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Не больше {config.USER_IMPORT_MAX_ROWS} строк в одном файле")
+
+    try:
+        return await user_import_service.import_users(
+            rows,
+            hash_passwords=lambda passwords: password_hash_pool.map(user_manager.password_helper.hash, passwords),
+        )
+    except UserImportError as e:
+        raise HTTPException(status_code=400, detail=e.errors)
+    except IntegrityError:
+        # Email заняли между проверкой и вставкой (регистрация или параллельный импорт)
+        raise HTTPException(status_code=409, detail="Часть email уже занята, повторите импорт")
+
@@ -0,0 +1,108 @@
+from functools import lru_cache
+from typing import Any, Callable, Iterable, get_args
+
+from fastapi import HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+from starlette import status
+from starlette.responses import JSONResponse
+
+
+def public_fields(schema: type[BaseModel]) -> tuple[str, ...]:
+    """Поля схемы, которые попадают в ответ (без exclude=True)"""
+    return tuple(name for name, field in schema.model_fields.items() if not field.exclude)
+
+
+def fields_param(schema: type[BaseModel]) -> Callable[..., tuple[str, ...] | None]:
+    """
+    Зависимость для параметра `fields` (sparse fieldset) по полям схемы ответа.
+
+    Возвращает запрошенные поля или None, если параметр не передан (полный ответ).
+    Поля, исключенные из ответа (например wb_token), запросить нельзя.
+    :param schema: Схема ответа эндпоинта
+    :return: функция-зависимость
+    """
+    allowed = public_fields(schema)
+
+    def dependency(
+            fields: str | None = Query(None, description="Поля ответа через запятую, например "
+                                                         f"`{','.join(allowed[:2])}`. По умолчанию все поля"),
+    ) -> tuple[str, ...] | None:
+        if fields is None:
+            return None
+
+        requested = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in requested if name not in allowed]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Неизвестные поля: {', '.join(unknown)}. Доступные поля: {', '.join(allowed)}",
+            )
+        return requested
+
+    return dependency
+
+
+def _nested_schema(schema: type[BaseModel], name: str) -> type[BaseModel] | None:
+    """Схема вложенного объекта поля (в том числе Optional[...]) или None для простых полей"""
+    annotation = schema.model_fields[name].annotation
+    for candidate in (annotation, *get_args(annotation)):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+
+def load_fields(schema: type[BaseModel], fields: Iterable[str] | None) -> tuple[str, ...] | None:
+    """
+    Поля модели для загрузки под выбранные поля ответа (fields_param).
+
+    Вложенная схема раскрывается в колонки связи ("user" -> "user.first_name", ...), чтобы связь
+    загружалась только с нужными колонками, а не целиком (например, без hashed_password пользователя).
+    :return: Поля для `fields` репозитория или None, если fields не переданы
+    """
+    if fields is None:
+        return None
+    result = []
+    for name in fields:
+        nested = _nested_schema(schema, name)
+        if nested is None:
+            result.append(name)
+        else:
+            result.extend(f"{name}.{nested_name}" for nested_name in public_fields(nested))
+    return tuple(result)
+
+
+@lru_cache
+def _field_adapter(schema: type[BaseModel], name: str) -> TypeAdapter:
+    return TypeAdapter(schema.model_fields[name].annotation)
+
+
+def dump_fields(schema: type[BaseModel], obj: Any, fields: Iterable[str]) -> dict[str, Any]:
+    """
+    Сериализует только перечисленные поля объекта по типам схемы.
+
+    Остальные атрибуты не читаются, поэтому объект может быть загружен с load_only.
+    """
+    result = {}
+    for name in fields:
+        adapter = _field_adapter(schema, name)
+        value = adapter.validate_python(getattr(obj, name), from_attributes=True)
+        result[name] = adapter.dump_python(value, mode="json")
+    return result
+
+
+def fields_response(schema: type[BaseModel], data: Any, fields: Iterable[str]) -> JSONResponse:
+    """Ответ с выбранными полями для одного объекта или списка объектов"""
+    fields = tuple(fields)
+    if isinstance(data, (list, tuple)):
+        return JSONResponse([dump_fields(schema, obj, fields) for obj in data])
+    return JSONResponse(dump_fields(schema, data, fields))
+
+
+def fields_page_response(schema: type[BaseModel], items: Iterable[Any], fields: Iterable[str], **page) -> JSONResponse:
+    """Страница (см. PageSchema) с выбранными полями объектов, page - остальные поля страницы"""
+    fields = tuple(fields)
+    return JSONResponse({
+        "items": [dump_fields(schema, obj, fields) for obj in items],
+        **jsonable_encoder(page),
+    })
@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+
+from fastapi import Query
+
+from wms_services.repositories.pagination import CountMode
+
+
+@dataclass
+class PaginationParams:
+    limit: int
+    cursor: str | None
+    count: CountMode | None = None
+
+
+def get_pagination_params(
+        limit: int = Query(50, ge=1, le=500, description="Количество записей на странице"),
+        cursor: str | None = Query(None, description="Курсор следующей страницы (`next_cursor` из предыдущего ответа)"),
+        count: CountMode | None = Query(None, description="Вернуть общее количество записей: exact - точно, "
+                                                          "capped - точно до предела, estimated - оценка "
+                                                          "планировщика. По умолчанию не считается"),
+) -> PaginationParams:
+    return PaginationParams(limit=limit, cursor=cursor, count=count)
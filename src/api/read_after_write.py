@@ -0,0 +1,57 @@
+from http.cookies import SimpleCookie
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from wms_services.repositories.routing import ReadAfterWrite, ReplicaRouter, read_after_write
+
+__all__ = ["ReadAfterWriteMiddleware", "READ_AFTER_WRITE_COOKIE", "READ_AFTER_WRITE_HEADER"]
+
+READ_AFTER_WRITE_COOKIE = "primary_until"
+READ_AFTER_WRITE_HEADER = "X-Primary-Until"
+
+
+class ReadAfterWriteMiddleware:
+    """
+    Переносит метку "после записи читаем с primary" (см. ReplicaRouter) между запросами клиента.
+
+    Метка приходит в cookie primary_until или заголовке X-Primary-Until (для клиентов без cookie)
+    и задает read_after_write на время запроса. Если запрос что-то записал, новая метка
+    возвращается в ответе в cookie и заголовке. Для потоковых ответов заголовки уходят до конца
+    обработки, поэтому записи после начала потока метку не выдают.
+    Без реплик middleware ничего не делает.
+    """
+
+    def __init__(self, app: ASGIApp, router: ReplicaRouter):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        marker = headers.get(READ_AFTER_WRITE_HEADER)
+        if marker is None:
+            cookie = SimpleCookie(headers.get("cookie", "")).get(READ_AFTER_WRITE_COOKIE)
+            marker = cookie.value if cookie is not None else None
+        state = ReadAfterWrite(primary_until=self.router.parse_marker(marker))
+
+        async def send_with_marker(message: Message):
+            if message["type"] == "http.response.start" and state.wrote:
+                marker = self.router.marker()
+                response_headers = MutableHeaders(scope=message)
+                response_headers.append(READ_AFTER_WRITE_HEADER, marker)
+                response_headers.append(
+                    "set-cookie",
+                    f"{READ_AFTER_WRITE_COOKIE}={marker}; Max-Age={int(self.router.sticky_seconds) + 1}; "
+                    f"Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        token = read_after_write.set(state)
+        try:
+            await self.app(scope, receive, send_with_marker)
+        finally:
+            read_after_write.reset(token)
@@ -0,0 +1,131 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+__all__ = ["TokenRevalidationScheduler"]
+
+
+class TokenRevalidationScheduler:
+    """
+    Фоновая перепроверка токенов кабинетов ВБ.
+
+    Gunicorn запускает несколько воркеров, и каждый стартует планировщик, но перепроверяет только
+    лидер - воркер, который взял сессионный advisory lock PostgreSQL на отдельном соединении.
+    Остальные раз в interval пробуют взять его же. Если лидер умирает, соединение закрывается,
+    PostgreSQL снимает блокировку, и ее забирает один из оставшихся воркеров.
+
+    Лидер перепроверяет пачки по batch_size (WBAccountsService.revalidate_stale): пока пачки
+    полные, следующая идет сразу, иначе - пауза interval (со случайным разбросом). Кабинеты,
+    проверка которых завершилась ошибкой, повторяются не раньше чем через retry_seconds.
+    """
+
+    def __init__(self,
+                 lock_id: int,
+                 interval: float,
+                 stale_seconds: float,
+                 batch_size: int,
+                 concurrency: int,
+                 jitter: float,
+                 retry_seconds: float):
+        self.lock_id = lock_id
+        self.interval = interval
+        self.stale_seconds = stale_seconds
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self.elections = 0
+        self.batches = 0
+        self.validated = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.last_batch: dict[str, Any] | None = None
+        self.lag_seconds = 0.0
+
+    def _pause(self) -> float:
+        return self.interval * random.uniform(0.9, 1.1)
+
+    async def _try_lock(self, connection: AsyncConnection) -> bool:
+        return bool((await connection.execute(text("SELECT pg_try_advisory_lock(:lock_id)"),
+                                              {"lock_id": self.lock_id})).scalar())
+
+    async def run(self):
+        """Выборы лидера и перепроверка, пока воркер жив (запускается при старте приложения)"""
+        from src.config.loader import engine
+
+        while True:
+            try:
+                async with engine.connect() as connection:
+                    # Без транзакции: соединение лидера висит в idle, а не idle in transaction
+                    await connection.execution_options(isolation_level="AUTOCOMMIT")
+                    if await self._try_lock(connection):
+                        try:
+                            await self._lead(connection)
+                        finally:
+                            self.is_leader = False
+                            # Блокировка сессионная: соединение не должно вернуться в пул с ней
+                            await connection.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Token revalidation failed: {e}")
+            await asyncio.sleep(self._pause())
+
+    async def _lead(self, connection: AsyncConnection):
+        from src.api.services_depends import build_wb_accounts_service
+        from src.config.loader import async_session_maker
+        from wms_services.repositories import UnitOfWork
+
+        self.is_leader = True
+        self.elections += 1
+        logger.info(f"Worker became token revalidation leader (lock {self.lock_id}).")
+        while True:
+            # Соединение с блокировкой оборвалось - лидерство, возможно, уже у другого воркера
+            await connection.execute(text("SELECT 1"))
+
+            async with async_session_maker() as session:
+                # Только с primary: реплика может еще не видеть статусы предыдущей пачки
+                service = build_wb_accounts_service(UnitOfWork(session), use_replica=False)
+                now = datetime.now()
+                summary = await service.revalidate_stale(
+                    self.batch_size,
+                    stale_before=now - timedelta(seconds=self.stale_seconds),
+                    concurrency=self.concurrency,
+                    jitter=self.jitter,
+                    retry_before=now - timedelta(seconds=self.retry_seconds),
+                )
+
+            self.batches += 1
+            self.validated += summary["total"] - summary["failed"]
+            self.failed += summary["failed"]
+            self.busy_seconds += summary["seconds"]
+            self.lag_seconds = summary["lag_seconds"]
+            self.last_batch = summary
+            if summary["total"]:
+                logger.info(f"Revalidated {summary['total']} WB accounts in {summary['seconds']:.1f}s, "
+                            f"{summary['failed']} failed, lag {summary['lag_seconds']:.0f}s.")
+
+            if summary["total"] < self.batch_size:
+                await asyncio.sleep(self._pause())
+
+    def stats(self) -> dict[str, Any]:
+        last = self.last_batch
+        return {
+            "is_leader": self.is_leader,
+            "elections": self.elections,
+            "batches": self.batches,
+            "validated": self.validated,
+            "failed": self.failed,
+            # Кабинетов в секунду: за последнюю пачку и за все время лидерства воркера
+            "throughput": last["total"] / last["seconds"] if last and last["seconds"] else 0.0,
+            "avg_throughput": (self.validated + self.failed) / self.busy_seconds if self.busy_seconds else 0.0,
+            # Сколько самый давний кабинет последней пачки ждал перепроверки сверх срока
+            "lag_seconds": self.lag_seconds,
+        }
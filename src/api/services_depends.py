@@ -3,32 +3,59 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from src.api.auth.manager import get_async_session
-from src.config.loader import fastapi_users
-from wms_services.models import User
+from src.api.auth.principal import Principal, current_principal
+from src.config.loader import entity_cache, token_metadata_cache, http_pool
 from wms_services.repositories import (
     ProfileDBRepository,
-    WBAccountsDBRepo
+    WBAccountsDBRepo,
+    UserDBRepository,
+    UnitOfWork,
 )
 from wms_services.services import (
     ProfileService,
-    WBAccountsService
+    WBAccountsService,
+    UserImportService,
 )
 
-def get_user(user: User = Depends(fastapi_users.current_user())) -> User:
-    if user is None or user.profile is None:
+def get_user(principal: Principal = Depends(current_principal())) -> Principal:
+    if principal.profile_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Profile does not exist")
-    return user
+    return principal
 
 
-def get_profile_service(session: AsyncSession = Depends(get_async_session)) -> ProfileService:
-    return ProfileService(ProfileDBRepository(session=session))
+def get_unit_of_work(session: AsyncSession = Depends(get_async_session)) -> UnitOfWork:
+    """Один unit of work на запрос: FastAPI кэширует зависимость, поэтому все сервисы запроса делят его"""
+    return UnitOfWork(session)
+
+
+def build_profile_service(uow: UnitOfWork) -> ProfileService:
+    return ProfileService(ProfileDBRepository(session=uow.session, uow=uow, cache=entity_cache), uow=uow)
+
+
+def build_wb_accounts_service(uow: UnitOfWork, use_replica: bool = True) -> WBAccountsService:
+    return WBAccountsService(
+        WBAccountsDBRepo(session=uow.session, uow=uow, cache=entity_cache, use_replica=use_replica),
+        ProfileDBRepository(session=uow.session, uow=uow, cache=entity_cache, use_replica=use_replica),
+        uow=uow,
+        token_cache=token_metadata_cache,
+        http_pool=http_pool,
+    )
+
+
+def get_profile_service(uow: UnitOfWork = Depends(get_unit_of_work)) -> ProfileService:
+    return build_profile_service(uow)
 
 
 def get_wb_accounts_service(
-        session: AsyncSession = Depends(get_async_session),
+        uow: UnitOfWork = Depends(get_unit_of_work),
 ) -> WBAccountsService:
-    return WBAccountsService(
-        WBAccountsDBRepo(session=session),
-        ProfileDBRepository(session=session),
-    )
\ No newline at end of file
+    return build_wb_accounts_service(uow)
+
+
+def get_user_import_service(uow: UnitOfWork = Depends(get_unit_of_work)) -> UserImportService:
+    return UserImportService(
+        UserDBRepository(session=uow.session, uow=uow, cache=entity_cache),
+        ProfileDBRepository(session=uow.session, uow=uow, cache=entity_cache),
+        uow=uow,
+    )
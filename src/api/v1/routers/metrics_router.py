@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+
+from src.api.v1.responses import COMMON_RESPONSES
+from src.config.loader import fastapi_users, entity_cache, principal_cache, token_versions, password_hash_pool, \
+    token_revalidation, token_metadata_cache, http_pool
+from wms_services.models import User
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get("", response_model=dict, responses=COMMON_RESPONSES)
+async def get_metrics(
+        user: User = Depends(fastapi_users.current_user(superuser=True))
+):
+    """Внутренние счетчики процесса (воркера), по которым настраиваются кэши и пулы (суперпользователь)"""
+    return {
+        "entity_cache": entity_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "token_metadata_cache": token_metadata_cache.stats(),
+        "token_versions": token_versions.stats(),
+        "password_hash_pool": password_hash_pool.stats(),
+        "token_revalidation": token_revalidation.stats(),
+        "http_pool": http_pool.stats(),
+    }
@@ -2,12 +2,17 @@ import uuid
 
 from fastapi import APIRouter, Depends, HTTPException, Path
 from starlette import status
+from starlette.responses import StreamingResponse
 
-from src.api.services_depends import get_profile_service
+from src.api.auth.principal import Principal, current_principal
+from src.api.fieldsets import fields_param, fields_response, fields_page_response, load_fields
+from src.api.pagination import PaginationParams, get_pagination_params
+from src.api.services_depends import get_profile_service, build_profile_service
 from src.api.v1.responses import COMMON_RESPONSES
-from src.config.loader import fastapi_users
-from wms_services.models import User
-from wms_services.schemas import ProfileResponseSchema, ProfileRequestSchema
+from src.api.v1.streaming import NDJSON_RESPONSES, ndjson_response
+from wms_services.exceptions.pagination_exceptions import InvalidCursorError
+from wms_services.repositories import UnitOfWork
+from wms_services.schemas import ProfileResponseSchema, ProfileRequestSchema, PageSchema
 from wms_services.services import ProfileService
 
 router = APIRouter(
@@ -37,54 +42,107 @@ async def extract_profile_from_user(kwargs) -> uuid.UUID:
 @router.get("/profile/{profile_id}", response_model=ProfileResponseSchema, responses=COMMON_RESPONSES)
 async def get_profile_by_profile_id(
         profile_id: uuid.UUID = Path(..., description="ID профиля"),
+        fields: tuple[str, ...] | None = Depends(fields_param(ProfileResponseSchema)),
         profile_service: ProfileService = Depends(get_profile_service),
-        user: User = Depends(fastapi_users.current_user())
+        user: Principal = Depends(current_principal())
 ):
     """Профиль пользователя по ID профиля (владелец профиля или суперпользователь)"""
-    profile = await profile_service.get_by_id(profile_id=profile_id)
+    profile = await profile_service.get_by_id(profile_id=profile_id,
+                                              fields=load_fields(ProfileResponseSchema, fields))
 
     if profile is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Профиль не найден")
 
+    if fields is not None:
+        return fields_response(ProfileResponseSchema, profile, fields)
     return ProfileResponseSchema.model_validate(profile)
 
 
 @router.get("/user/{user_id}", response_model=ProfileResponseSchema, responses=COMMON_RESPONSES)
 async def get_profile_by_user_id(
         user_id: uuid.UUID = Path(..., description="ID профиля"),
+        fields: tuple[str, ...] | None = Depends(fields_param(ProfileResponseSchema)),
         profile_service: ProfileService = Depends(get_profile_service),
-        user: User = Depends(fastapi_users.current_user())
+        user: Principal = Depends(current_principal())
 ):
     """Профиль пользователя по ID пользователя (суперпользователь)"""
-    profile = await profile_service.get_by_id(user_id=user_id)
+    profile = await profile_service.get_by_id(user_id=user_id,
+                                              fields=load_fields(ProfileResponseSchema, fields))
 
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Профиль не найден")
 
+    if fields is not None:
+        return fields_response(ProfileResponseSchema, profile, fields)
     return ProfileResponseSchema.model_validate(profile)
 
 
 @router.get("/current-user", response_model=ProfileResponseSchema, responses=COMMON_RESPONSES)
 async def get_profile_by_user_id(
+        fields: tuple[str, ...] | None = Depends(fields_param(ProfileResponseSchema)),
         profile_service: ProfileService = Depends(get_profile_service),
-        user: User = Depends(fastapi_users.current_user())
+        user: Principal = Depends(current_principal())
 ):
     """Профиль текущего пользователя"""
-    profile = await profile_service.get_by_id(user_id=user.id)
+    profile = await profile_service.get_by_id(user_id=user.id,
+                                              fields=load_fields(ProfileResponseSchema, fields))
 
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Профиль не найден")
 
+    if fields is not None:
+        return fields_response(ProfileResponseSchema, profile, fields)
     return ProfileResponseSchema.model_validate(profile)
 
 
-@router.get("/profiles", response_model=list[ProfileResponseSchema], responses=COMMON_RESPONSES)
+@router.get("/profiles", response_model=PageSchema[ProfileResponseSchema], responses=COMMON_RESPONSES)
 async def get_all_profiles(
+        pagination: PaginationParams = Depends(get_pagination_params),
+        fields: tuple[str, ...] | None = Depends(fields_param(ProfileResponseSchema)),
         profile_service: ProfileService = Depends(get_profile_service),
-        user: User = Depends(fastapi_users.current_user())
+        user: Principal = Depends(current_principal())
 ):
     """Список профилей (суперпользователь)"""
-    profiles = await profile_service.get_all_profiles()
+    try:
+        profiles, next_cursor = await profile_service.get_profiles_page(limit=pagination.limit,
+                                                                        cursor=pagination.cursor,
+                                                                        fields=load_fields(ProfileResponseSchema,
+                                                                                           fields))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    total = await profile_service.count_profiles(pagination.count) if pagination.count is not None else None
+
+    if fields is not None:
+        return fields_page_response(ProfileResponseSchema, profiles, fields, next_cursor=next_cursor,
+                                    total=total, total_mode=pagination.count)
+    return PageSchema[ProfileResponseSchema](
+        items=[ProfileResponseSchema.model_validate(profile) for profile in profiles],
+        next_cursor=next_cursor,
+        total=total,
+        total_mode=pagination.count,
+    )
+
+
+@router.get("/profiles/stream", response_class=StreamingResponse,
+            responses={**COMMON_RESPONSES, **NDJSON_RESPONSES})
+async def stream_all_profiles(
+        user: Principal = Depends(current_principal())
+):
+    """Выгрузка всех профилей потоком NDJSON (суперпользователь)"""
+    return ndjson_response(
+        ProfileResponseSchema,
+        lambda session: build_profile_service(UnitOfWork(session)).stream_profiles(),
+    )
+
+
+@router.post("/import", response_model=list[ProfileResponseSchema], responses=COMMON_RESPONSES)
+async def import_profiles(
+        profiles: list[ProfileRequestSchema],
+        profile_service: ProfileService = Depends(get_profile_service),
+        user: Principal = Depends(current_principal(active=True, superuser=True))
+):
+    """Массовое создание профилей (суперпользователь)"""
+    profiles = await profile_service.import_profiles(profiles)
     return [ProfileResponseSchema.model_validate(profile) for profile in profiles]
 
 
@@ -93,7 +151,7 @@ async def update_profile(
         updated_data: ProfileRequestSchema,
         profile_id: uuid.UUID = Path(..., description="ID профиля"),
         profile_service: ProfileService = Depends(get_profile_service),
-        user: User = Depends(fastapi_users.current_user())
+        user: Principal = Depends(current_principal())
 ):
     """Изменение профиля по ID профиля (суперпользователь)"""
 
@@ -106,7 +164,7 @@ async def update_profile(
 async def delete_profile(
         profile_id: uuid.UUID,
         profile_service: ProfileService = Depends(get_profile_service),
-        user: User = Depends(fastapi_users.current_user())
+        user: Principal = Depends(current_principal())
 ):
     """Удаление профиля по ID профиля (суперпользователь)"""
 
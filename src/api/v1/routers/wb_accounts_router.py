@@ -3,22 +3,32 @@ from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Path
 from starlette import status
+from starlette.responses import StreamingResponse
 
+from src.api.fieldsets import fields_param, fields_response, fields_page_response
+from src.api.pagination import PaginationParams, get_pagination_params
 from src.api.services_depends import (
     get_wb_accounts_service,
     get_profile_service,
     get_user,
+    build_wb_accounts_service,
 )
+from src.api.auth.principal import Principal
 from src.api.v1.responses import COMMON_RESPONSES
-from wms_services.exceptions.accounts_exceptions import WbAccountNotFoundError
-from wms_services.models import (
-    User,
-    ProfileModel
-)
+from src.api.v1.streaming import NDJSON_RESPONSES, ndjson_response
+from src.config.loader import config
+from wms_services.exceptions.accounts_exceptions import WbAccountNotFoundError, WbAccountSearchError
+from wms_services.exceptions.pagination_exceptions import InvalidCursorError
+from wms_services.repositories import UnitOfWork
 from wms_services.schemas import (
     CreateWBAccountSchema,
     ResponseWBAccountSchema,
     UpdateWBAccountSchema,
+    ImportWBAccountSchema,
+    SearchWBAccountSchema,
+    ValidateWBAccountsSchema,
+    WBAccountsValidationProgressSchema,
+    PageSchema,
 )
 from wms_services.services import (
     WBAccountsService,
@@ -34,67 +44,149 @@ router = APIRouter(
 @router.post("/create", response_model=ResponseWBAccountSchema, responses=COMMON_RESPONSES)
 async def create_wb_account(
         wb_data: CreateWBAccountSchema,
-        user: User = Depends(get_user),
+        user: Principal = Depends(get_user),
         wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service),
         profile_service: ProfileService = Depends(get_profile_service),
         # для того, чтобы декоратор мог проверить валидность профиля
 ):
     """Подключить кабинет ВБ к профилю"""
 
-    profile: ProfileModel = user.profile
     wb_account = await wb_accounts_service.add_account(
-        profile_id=profile.id,
+        profile_id=user.profile_id,
         account_create_data=wb_data
     )
 
     return ResponseWBAccountSchema.model_validate(wb_account)
 
 
-@router.get("/all", response_model=List[ResponseWBAccountSchema], responses=COMMON_RESPONSES)
+@router.post("/import", response_model=List[ResponseWBAccountSchema], responses=COMMON_RESPONSES)
+async def import_wb_accounts(
+        accounts: List[ImportWBAccountSchema],
+        user: Principal = Depends(get_user),
+        wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service),
+):
+    """Массовый импорт кабинетов ВБ в профиль текущего пользователя.
+    Кабинеты с ID обновляются, без ID создаются. Токены проверяются отдельно"""
+    return await wb_accounts_service.import_accounts(
+        profile_id=user.profile_id,
+        accounts=accounts,
+    )
+
+
+@router.get("/all", response_model=PageSchema[ResponseWBAccountSchema], responses=COMMON_RESPONSES)
 async def get_all_accounts(
-        user: User = Depends(get_user),
+        pagination: PaginationParams = Depends(get_pagination_params),
+        fields: tuple[str, ...] | None = Depends(fields_param(ResponseWBAccountSchema)),
+        user: Principal = Depends(get_user),
         wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service)
 ):
     """Список всех кабинетов"""
-    accs = await wb_accounts_service.get_all()
+    try:
+        accs, next_cursor = await wb_accounts_service.get_page(limit=pagination.limit, cursor=pagination.cursor,
+                                                               fields=fields)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    if not accs:
+    if not accs and pagination.cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Не найдено кабинетов"
         )
 
-    return accs
+    total = await wb_accounts_service.count_accounts(pagination.count) if pagination.count is not None else None
+
+    if fields is not None:
+        return fields_page_response(ResponseWBAccountSchema, accs, fields, next_cursor=next_cursor,
+                                    total=total, total_mode=pagination.count)
+    return PageSchema[ResponseWBAccountSchema](items=accs, next_cursor=next_cursor,
+                                               total=total, total_mode=pagination.count)
+
+
+@router.post("/search", response_model=PageSchema[ResponseWBAccountSchema], responses=COMMON_RESPONSES)
+async def search_accounts(
+        query: SearchWBAccountSchema,
+        pagination: PaginationParams = Depends(get_pagination_params),
+        user: Principal = Depends(get_user),
+        wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service),
+):
+    """Поиск кабинетов по мета-данным токена и кабинета.
+    Суперпользователь ищет среди всех кабинетов, остальные - среди кабинетов своего профиля"""
+    try:
+        accs, next_cursor = await wb_accounts_service.search_accounts(
+            query,
+            limit=pagination.limit,
+            cursor=pagination.cursor,
+            profile_id=None if user.is_superuser else user.profile_id,
+        )
+    except (InvalidCursorError, WbAccountSearchError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return PageSchema[ResponseWBAccountSchema](items=accs, next_cursor=next_cursor)
+
+
+@router.get("/all/stream", response_class=StreamingResponse,
+            responses={**COMMON_RESPONSES, **NDJSON_RESPONSES})
+async def stream_all_accounts(
+        user: Principal = Depends(get_user),
+):
+    """Выгрузка всех кабинетов потоком NDJSON"""
+    return ndjson_response(
+        ResponseWBAccountSchema,
+        lambda session: build_wb_accounts_service(UnitOfWork(session)).stream_all(),
+    )
+
+
+@router.post("/validate", response_class=StreamingResponse,
+             responses={**COMMON_RESPONSES, **NDJSON_RESPONSES})
+async def validate_wb_accounts(
+        query: ValidateWBAccountsSchema,
+        user: Principal = Depends(get_user),
+):
+    """Проверка токенов кабинетов профиля (или указанных кабинетов) с прогрессом потоком NDJSON.
+    Строка на каждый проверенный кабинет, в последней строке - итог. Статусы сохраняются в конце проверки.
+    Суперпользователь может указать любые кабинеты, остальные - только кабинеты своего профиля"""
+    return ndjson_response(
+        WBAccountsValidationProgressSchema,
+        lambda session: build_wb_accounts_service(UnitOfWork(session)).validate_accounts(
+            account_ids=query.account_ids,
+            profile_id=None if user.is_superuser and query.account_ids is not None else user.profile_id,
+            concurrency=config.WB_VALIDATION_CONCURRENCY,
+        ),
+    )
 
 
 @router.get("/{account_id}", response_model=ResponseWBAccountSchema, responses=COMMON_RESPONSES)
 async def get_account(
         account_id: uuid.UUID,
-        user: User = Depends(get_user),
+        fields: tuple[str, ...] | None = Depends(fields_param(ResponseWBAccountSchema)),
+        user: Principal = Depends(get_user),
         wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service),
 ):
     """Получить кабинет по ID кабинета"""
-    acc = await wb_accounts_service.get_accounts_by_id(account_id=account_id)
+    acc = await wb_accounts_service.get_accounts_by_id(account_id=account_id, fields=fields)
 
+    if fields is not None:
+        return fields_response(ResponseWBAccountSchema, acc, fields)
     return acc
 
 
 @router.get("/current-user/accounts", response_model=List[ResponseWBAccountSchema], responses=COMMON_RESPONSES)
 async def get_current_user_wb_accounts(
-        user: User = Depends(get_user),
+        fields: tuple[str, ...] | None = Depends(fields_param(ResponseWBAccountSchema)),
+        user: Principal = Depends(get_user),
         wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service),
 ):
     """Получить список кабинетов для текущего пользователя"""
-    profile: ProfileModel = user.profile
-
-    accs = await wb_accounts_service.get_accounts_by_id(profile_id=user.profile.id)
+    accs = await wb_accounts_service.get_accounts_by_id(profile_id=user.profile_id, fields=fields)
 
+    if fields is not None:
+        return fields_response(ResponseWBAccountSchema, accs, fields)
     return accs
 
 @router.delete("/{account_id}", status_code=status.HTTP_204_NO_CONTENT, responses=COMMON_RESPONSES)
 async def delete_wb_account(
         account_id: uuid.UUID,
-        user: User = Depends(get_user),
+        user: Principal = Depends(get_user),
         wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service)
 ):
     """Удалить ВБ кабинет"""
@@ -105,9 +197,25 @@ async def delete_wb_account(
         )
 
 
+@router.delete("", response_model=List[uuid.UUID], responses=COMMON_RESPONSES)
+async def delete_wb_accounts(
+        account_ids: List[uuid.UUID],
+        user: Principal = Depends(get_user),
+        wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service)
+):
+    """Удалить несколько ВБ кабинетов текущего пользователя. Возвращает ID удаленных кабинетов"""
+    return await wb_accounts_service.delete_accounts(
+        account_ids=account_ids,
+        profile_id=user.profile_id,
+    )
+
+
 @router.get("/ping/{account_id}", response_model=bool, responses=COMMON_RESPONSES)
 async def ping_account(
         account_id: uuid.UUID,
         wb_accounts_service: WBAccountsService = Depends(get_wb_accounts_service)
 ):
-    return await wb_accounts_service.ping(account_id=account_id)
+    try:
+        return await wb_accounts_service.ping(account_id=account_id)
+    except WbAccountNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
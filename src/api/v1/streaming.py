@@ -0,0 +1,37 @@
+from typing import AsyncIterator, Callable
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
+
+from src.config.loader import async_session_maker
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+NDJSON_RESPONSES = {
+    200: {
+        "description": "Поток объектов в формате NDJSON (один JSON-объект на строку)",
+        "content": {NDJSON_MEDIA_TYPE: {}},
+    }
+}
+
+
+def ndjson_response(
+        schema: type[BaseModel],
+        items: Callable[[AsyncSession], AsyncIterator],
+) -> StreamingResponse:
+    """
+    Отдает объекты построчно в формате NDJSON по мере чтения из БД.
+
+    Сессия открывается внутри тела ответа, а не через Depends: зависимости с yield
+    закрываются до того, как StreamingResponse начнет отдавать данные.
+    :param schema: Схема, через которую сериализуется каждый объект
+    :param items: Функция, которая по сессии возвращает асинхронный итератор объектов
+    :return: потоковый ответ
+    """
+    async def body() -> AsyncIterator[str]:
+        async with async_session_maker() as session:
+            async for item in items(session):
+                yield schema.model_validate(item).model_dump_json() + "\n"
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
@@ -7,7 +7,13 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from src.api.auth.auth import auth_backend
 from src.api.auth.manager import get_user_manager
-from wms_services.models import User
+from src.api.auth.passwords import PasswordHashPool
+from src.api.auth.principal import TokenVersions
+from src.api.revalidation import TokenRevalidationScheduler
+from wms_services.models import User, ProfileModel
+from wms_services.repositories import EntityCache, PrincipalCache, TokenMetadataCache
+from wms_services.repositories.routing import ReplicaRouter, RoutingSession, ROUTER_INFO_KEY
+from wms_services.utils.http_pool import HTTPClientPool
 from . import config
 
 fastapi_users = FastAPIUsers[User, uuid.UUID](
@@ -20,7 +26,53 @@ DATABASE_URL = f"postgresql+asyncpg://{config.POSTGRES_USER}:{config.POSTGRES_PA
 
 
 engine = create_async_engine(DATABASE_URL)
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+replica_engines = [create_async_engine(url) for url in config.replica_database_urls]
+replica_router = ReplicaRouter(
+    primary=engine,
+    replicas=replica_engines,
+    sticky_seconds=config.REPLICA_STICKY_SECONDS,
+    # Подпись меток "читать с primary", которые хранит клиент (см. ReadAfterWriteMiddleware)
+    secret=config.JWT_SECRET,
+)
+async_session_maker = async_sessionmaker(
+    engine,
+    expire_on_commit=False,
+    sync_session_class=RoutingSession,
+    info={ROUTER_INFO_KEY: replica_router},
+)
+
+# Доступен, пока воркер слушает сбросы от остальных воркеров (listen_invalidations в lifespan)
+entity_cache = EntityCache(max_size=config.ENTITY_CACHE_MAX_SIZE, ttl=config.ENTITY_CACHE_TTL_SECONDS,
+                           channel=config.ENTITY_CACHE_CHANNEL)
+# Пользователь с профилем: устаревает при записи в пользователей или профили
+principal_cache = PrincipalCache(
+    max_size=config.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=config.PRINCIPAL_CACHE_TTL_SECONDS,
+    entity_cache=entity_cache,
+    depends_on=(User, ProfileModel),
+)
+# Актуальные версии пользователей для проверки токенов в режиме AUTH_STATELESS
+token_versions = TokenVersions(max_size=config.PRINCIPAL_CACHE_MAX_SIZE)
+token_metadata_cache = TokenMetadataCache(max_size=config.WB_TOKEN_CACHE_MAX_SIZE,
+                                          ttl=config.WB_TOKEN_CACHE_TTL_SECONDS)
+# Соединения к API маркетплейса, открывается и закрывается в lifespan приложения
+http_pool = HTTPClientPool(
+    max_connections=config.HTTP_POOL_MAX_CONNECTIONS,
+    max_per_host=config.HTTP_POOL_MAX_PER_HOST,
+    keepalive_expiry=config.HTTP_POOL_KEEPALIVE_SECONDS,
+    timeout=config.HTTP_TIMEOUT_SECONDS,
+    http2=config.HTTP2_ENABLED,
+)
+password_hash_pool = PasswordHashPool(workers=config.PASSWORD_HASH_WORKERS, max_queue=config.PASSWORD_HASH_MAX_QUEUE)
+token_revalidation = TokenRevalidationScheduler(
+    lock_id=config.WB_REVALIDATION_LOCK_ID,
+    interval=config.WB_REVALIDATION_INTERVAL_SECONDS,
+    stale_seconds=config.WB_REVALIDATION_STALE_SECONDS,
+    batch_size=config.WB_REVALIDATION_BATCH_SIZE,
+    concurrency=config.WB_VALIDATION_CONCURRENCY,
+    jitter=config.WB_REVALIDATION_JITTER_SECONDS,
+    retry_seconds=config.WB_REVALIDATION_RETRY_SECONDS,
+)
 
 
 def ensure_directory_exists(pathdirs: list[list[str]]):
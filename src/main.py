@@ -1,28 +1,76 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from starlette import status
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
 
+from src.api.auth.principal import sync_token_versions
+from src.api.read_after_write import ReadAfterWriteMiddleware, READ_AFTER_WRITE_HEADER
 from src.api.auth.router import router as auth_backend_router, users_router
 from src.api.auth.schemas import UserRead, UserCreate, UserUpdate
+from src.api.v1.routers.metrics_router import router as metrics_router
 from src.api.v1.routers.profile_router import router as profile_router
 from src.api.v1.routers.wb_accounts_router import router as wb_accounts_router
 from src.config import config
-from src.config.loader import fastapi_users, ensure_directory_exists
+from src.config.loader import fastapi_users, ensure_directory_exists, password_hash_pool, token_revalidation, \
+    http_pool, replica_router, engine, entity_cache
+from wms_services.exceptions.accounts_exceptions import WbTokenCheckError
+from wms_services.exceptions.auth_exceptions import PasswordHashingBusyError
+from wms_services.repositories.cache_sync import listen_invalidations
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_directory_exists(
+        [
+            ["src", "assets"],
+            ["src", "assets", "reports"]
+        ]
+    )
+    # Соединения к API маркетплейса общие для всех запросов и фоновых задач воркера
+    await http_pool.start()
+    # Версии пользователей для access токенов AUTH_STATELESS и отзыва refresh токенов.
+    # Ссылка на задачу хранится в app.state, иначе ее может собрать сборщик мусора
+    app.state.token_versions_sync = asyncio.create_task(sync_token_versions(config.AUTH_VERSION_SYNC_SECONDS))
+    # Сбросы кэша сущностей от всех воркеров: до подключения к каналу кэш не используется
+    app.state.cache_invalidations = asyncio.create_task(
+        listen_invalidations(engine, entity_cache, config.ENTITY_CACHE_LISTEN_CHECK_SECONDS))
+    # Перепроверка токенов кабинетов: запускается в каждом воркере, работает только лидер
+    app.state.token_revalidation = (asyncio.create_task(token_revalidation.run())
+                                    if config.WB_REVALIDATION_ENABLED else None)
+
+    yield
+
+    app.state.token_versions_sync.cancel()
+    app.state.cache_invalidations.cancel()
+    if app.state.token_revalidation is not None:
+        app.state.token_revalidation.cancel()
+    password_hash_pool.shutdown()
+    await http_pool.aclose()
+
 
 app = FastAPI(
     title="WMS Rest API",
     # version=config.DOCKER_IMAGE_VERSION,
+    lifespan=lifespan,
 )
 
+# После записи клиент читает с primary на любом воркере (метка в cookie/заголовке, см. ReplicaRouter)
+app.add_middleware(ReadAfterWriteMiddleware, router=replica_router)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=config.CORS_ORIGINS.split(','),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[READ_AFTER_WRITE_HEADER],
 )
 app.include_router(profile_router, prefix="/api/v1")
 app.include_router(wb_accounts_router, prefix="/api/v1")
+app.include_router(metrics_router, prefix="/api/v1")
 
 app.include_router(auth_backend_router, prefix="/api")
 app.include_router(users_router, prefix="/api")
@@ -41,11 +89,14 @@ app.include_router(
 )
 
 
-@app.on_event("startup")
-async def startup_event():
-    ensure_directory_exists(
-        [
-            ["src", "assets"],
-            ["src", "assets", "reports"]
-        ]
-    )
+@app.exception_handler(PasswordHashingBusyError)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusyError):
+    # Вход и регистрация во время шторма входов: клиент повторит позже, остальные запросы не ждут
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)},
+                        headers={"Retry-After": "1"})
+
+
+@app.exception_handler(WbTokenCheckError)
+async def wb_token_check_handler(request: Request, exc: WbTokenCheckError):
+    # ВБ недоступен: кабинет не создается и не меняется, клиент повторит позже
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)})
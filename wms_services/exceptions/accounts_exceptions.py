@@ -1,4 +1,9 @@
-from wms_services.exceptions.base_exceptions import BaseNotFoundError, BaseInactiveError
+from wms_services.exceptions.base_exceptions import (
+    BaseNotFoundError,
+    BaseInactiveError,
+    BaseBadRequestError,
+    BaseServiceException,
+)
 
 
 class WbAccountNotFoundError(BaseNotFoundError):
@@ -9,3 +14,14 @@ class WbAccountNotFoundError(BaseNotFoundError):
 class WbAccountInactiveError(BaseInactiveError):
     def __init__(self):
         super().__init__("Данный WB кабинет неактивен")
+
+
+class WbAccountSearchError(BaseBadRequestError):
+    def __init__(self):
+        super().__init__(None, "Некорректный запрос поиска кабинетов (проверьте JSONPath)")
+
+
+class WbTokenCheckError(BaseServiceException):
+    """ВБ не ответил на проверку токена (сеть, таймаут, 5xx): действителен ли токен, неизвестно"""
+    def __init__(self, reason: str):
+        super().__init__(f"Не удалось проверить токен в ВБ: {reason}")
@@ -0,0 +1,6 @@
+from wms_services.exceptions.base_exceptions import BaseServiceException
+
+
+class PasswordHashingBusyError(BaseServiceException):
+    def __init__(self):
+        super().__init__("Слишком много одновременных входов, повторите попытку позже")
@@ -0,0 +1,6 @@
+from wms_services.exceptions.base_exceptions import BaseBadRequestError
+
+
+class InvalidCursorError(BaseBadRequestError):
+    def __init__(self):
+        super().__init__(None, "Некорректный курсор пагинации")
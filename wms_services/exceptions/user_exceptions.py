@@ -0,0 +1,13 @@
+from typing import Any
+
+from wms_services.exceptions.base_exceptions import BaseBadRequestError, BaseFileError
+
+
+class UserImportError(BaseBadRequestError):
+    def __init__(self, errors: list[dict[str, Any]]):
+        super().__init__(errors, "Файл импорта пользователей содержит ошибки, пользователи не созданы")
+
+
+class UserImportFileError(BaseFileError):
+    def __init__(self, message: str):
+        super().__init__(message)
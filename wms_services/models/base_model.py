@@ -1,16 +1,22 @@
-import uuid
 from sqlalchemy import Column, DateTime, func, UUID
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase
 
+from wms_services.utils.uuid7 import uuid7
+
 
 __all__ = ["Base"]
 
 # Здесь можно определить поля, которые общие для всех
 class Base(AsyncAttrs, DeclarativeBase):
     __abstract__ = True
-    
-    id = Column(UUID, unique=True, primary_key=True, default=uuid.uuid4,
+    # server_default/onupdate значения (created_at, updated_at) забираются через RETURNING
+    # в том же INSERT/UPDATE, что и flush, без отдельного SELECT после коммита
+    __mapper_args__ = {"eager_defaults": True}
+
+    # uuid7 упорядочен по времени: вставки идут в конец индекса первичного ключа.
+    # Колонка та же (uuid), существующие ключи uuid4 остаются как есть
+    id = Column(UUID, unique=True, primary_key=True, default=uuid7,
                 comment="Уникальный идентификатор объекта")
     created_at = Column(DateTime,
                         default=func.now(),
@@ -1,19 +1,34 @@
 from enum import Enum as PyEnum
 
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTableUUID
-from sqlalchemy import Column, String, UUID, ForeignKey, JSON, DateTime, Integer
-from sqlalchemy.orm import relationship
+from fastapi_users_db_sqlalchemy.generics import GUID
+from sqlalchemy import Column, String, UUID, ForeignKey, DateTime, Integer, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, mapped_column
 
 from wms_services.models.base_model import Base
+from wms_services.utils.uuid7 import uuid7
 
 __all__ = ["User", "ProfileModel", "WBAccountModel", "WBAccountStatus"]
 
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
     """Модель пользователя"""
-    __table_args__ = {
-        'comment': 'Модель пользователя',
-    }
+    __table_args__ = (
+        # Индекс для keyset-пагинации (см. BaseDBRepository.get_page)
+        Index('ix_user_created_at_id', 'created_at', 'id'),
+        # fastapi-users ищет пользователя при входе по lower(email) = lower(:email), список
+        # пользователей фильтрует по префиксу lower(email) LIKE 'prefix%': text_pattern_ops
+        # нужен для LIKE при любой локали БД и подходит для равенства
+        Index('ix_user_email_lower', func.lower(text('email')).label('email_lower'),
+              postgresql_ops={'email_lower': 'text_pattern_ops'}),
+        {
+            'comment': 'Модель пользователя',
+        },
+    )
+
+    # fastapi-users по умолчанию генерирует uuid4, как и Base - uuid7
+    id = mapped_column(GUID, primary_key=True, default=uuid7)
 
     first_name = Column(String(100), nullable=False,
                         comment="Имя")
@@ -22,14 +37,20 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
                         comment="Фамилия")
     role = Column(String(100), nullable=False, default='Пользователь',
                   comment="Роль пользователя")
+    # Увеличивается при смене пароля, прав или активности: access токены с прежней версией
+    # отклоняются в режиме AUTH_STATELESS (см. src.api.auth.principal)
+    token_version = Column(Integer, nullable=False, default=0, server_default=text("0"),
+                           comment="Версия данных пользователя в токенах")
 
+    # Связи моделей не загружаются неявно: запрос выбирает профиль загрузки
+    # (см. wms_services.repositories.loaders), обращение к незагруженной связи - ошибка
     profile = relationship(
         "ProfileModel",
         back_populates="user",
         cascade="all, delete-orphan",
         passive_deletes=True,
         uselist=False,
-        lazy="selectin"
+        lazy="raise_on_sql"
     )
 
 
@@ -37,9 +58,12 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
 class ProfileModel(Base):
     """Модель профиля пользователя"""
     __tablename__ = 'profiles'
-    __table_args__ = {
-        'comment': 'Модель профиля пользователя',
-    }
+    __table_args__ = (
+        Index('ix_profiles_created_at_id', 'created_at', 'id'),
+        {
+            'comment': 'Модель профиля пользователя',
+        },
+    )
 
     user_id = Column(UUID, ForeignKey('user.id', ondelete='CASCADE'), unique=True, nullable=False,
                      comment="ID пользователя, привязанного к профилю")
@@ -48,7 +72,7 @@ class ProfileModel(Base):
         "User",
         back_populates="profile",
         uselist=False,
-        lazy="joined"
+        lazy="raise_on_sql"
     )
 
     wb_accounts = relationship(
@@ -56,7 +80,7 @@ class ProfileModel(Base):
         back_populates="profile",
         cascade="all, delete-orphan",
         passive_deletes=True,
-        lazy="selectin"
+        lazy="raise_on_sql"
     )
 
     @property
@@ -71,32 +95,53 @@ class WBAccountStatus(PyEnum):
 class WBAccountModel(Base):
     """Модель кабинета маркетплейса WB"""
     __tablename__ = "wb_accounts"
-    __table_args__ = {
-        'comment': 'Модель кабинета маркетплейса WB',
-    }
+    __table_args__ = (
+        Index('ix_wb_accounts_created_at_id', 'created_at', 'id'),
+        # Кабинеты профиля (get_accounts_by_id, страница кабинетов профиля), каскадное удаление профиля
+        Index('ix_wb_accounts_profile_id_created_at_id', 'profile_id', 'created_at', 'id'),
+        # Выборка кабинетов на перепроверку токена: статус + давно не проверялись
+        Index('ix_wb_accounts_status_last_token_validate_at', 'status', 'last_token_validate_at'),
+        # Активные кабинеты с истекшим токеном (фоновая перепроверка)
+        Index('ix_wb_accounts_status_token_expires_at', 'status', 'token_expires_at'),
+        # Кабинеты, токен которых еще ни разу не проверялся (частичный индекс, мал по размеру)
+        Index('ix_wb_accounts_not_validated', 'created_at',
+              postgresql_where=text('last_token_validate_at IS NULL')),
+        # Поиск внутри JSON: @> (contains) и @? (path_exists), см. BaseDBRepository.json_contains
+        Index('ix_wb_accounts_token_metadata', 'token_metadata',
+              postgresql_using='gin', postgresql_ops={'token_metadata': 'jsonb_path_ops'}),
+        Index('ix_wb_accounts_details', 'details',
+              postgresql_using='gin', postgresql_ops={'details': 'jsonb_path_ops'}),
+        {
+            'comment': 'Модель кабинета маркетплейса WB',
+        },
+    )
     name = Column(String, server_default="Marketplace Account", nullable=False,
                   comment="Название кабинета")
     profile_id = Column(UUID, ForeignKey('profiles.id', ondelete='CASCADE'), nullable=False,
                         comment="ID профиля владельца кабинета")
     wb_token = Column(String, nullable=False,
                       comment="Токен для доступа к API маркетплейса")
-    token_metadata = Column(JSON, nullable=True,
+    token_metadata = Column(JSONB, nullable=True,
                             comment="Мета-данные токена")
     status = Column(Integer,
                     server_default=str(WBAccountStatus.NOT_CHECKED.value),
                     default=WBAccountStatus.NOT_CHECKED.value, nullable=False,
                     comment="Статус кабинета. Может принимать значения: "
                             "INACTIVE (неактивный), ACTIVE (активный), NOT_CHECKED (не проверен)")
-    details = Column(JSON, nullable=True,
+    details = Column(JSONB, nullable=True,
                      comment="Мета-данные кабинета")
 
     last_token_validate_at = Column(DateTime, nullable=True,
                                     comment="Дата и время последней проверки токена")
+    token_expires_at = Column(DateTime, nullable=True,
+                              comment="Срок действия токена (exp), если токен его содержит")
+    token_validate_failed_at = Column(DateTime, nullable=True,
+                                      comment="Когда последняя проверка токена завершилась ошибкой")
     last_cards_sync_at = Column(DateTime, nullable=True,
                                 comment="Дата и время последней синхронизации карточек")
 
     profile = relationship(
         "ProfileModel",
         back_populates="wb_accounts",
-        lazy="selectin"
+        lazy="raise_on_sql"
     )
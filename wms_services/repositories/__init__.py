@@ -1,3 +1,7 @@
+from wms_services.repositories.cache import *
+from wms_services.repositories.cache_sync import *
 from wms_services.repositories.profile_repo import *
 from wms_services.repositories.user_repo import *
 from wms_services.repositories.wb_accounts_repo import *
+from wms_services.repositories.unit_of_work import *
+from wms_services.repositories.loaders import *
@@ -1,10 +1,20 @@
+import json
 from functools import wraps
-from typing import TypeVar, Generic, Sequence, Any, Union
+from typing import TypeVar, Generic, Sequence, Any, Union, AsyncIterator, ClassVar
 
-from sqlalchemy import select, update, delete
-from sqlalchemy.exc import SQLAlchemyError
+import asyncpg
+from sqlalchemy import select, update, delete, insert, tuple_, func, bindparam, Select, literal, text, cast, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert, JSONPATH
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError, DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, load_only, raiseload
+
+from wms_services.repositories.cache import EntityCache, row_tags
+from wms_services.repositories.cache_sync import apply_invalidation, publish_invalidation
+from wms_services.repositories.loaders import LoaderProfile
+from wms_services.repositories.pagination import encode_cursor, decode_cursor, CountMode
+from wms_services.repositories.routing import REPLICA_BIND_ARGUMENTS
+from wms_services.repositories.unit_of_work import UnitOfWork
 
 AbstractModel = TypeVar('AbstractModel')
 
@@ -24,40 +34,233 @@ def rollback_wrapper(func):
 
 class BaseDBRepository(Generic[AbstractModel]):
     type_model: type[AbstractModel]
+    # Размер пачки строк, которые stream_where забирает из курсора за раз
+    stream_chunk_size: int = 1000
+    # Количество строк в одном INSERT ... ON CONFLICT у bulk_upsert
+    upsert_chunk_size: int = 500
+    # Предел подсчета для CountMode.CAPPED
+    count_cap: int = 1000
+    # Шаблоны запросов get_by, общие для всех экземпляров репозиториев:
+    # (модель, колонка, загружаемые связи) -> select с bindparam("value")
+    _statement_cache: ClassVar[dict[tuple, Select]] = {}
+    # Колонки, поиск по которым (get/get_by с many=False) идет через кэш сущностей
+    cached_columns: tuple[str, ...] = ("id",)
+    # Модели, строки которых удаляются каскадом вместе со строками этого репозитория:
+    # при удалении их записи в кэше сбрасываются целиком (строки каскада заранее неизвестны)
+    cache_invalidates: tuple[type, ...] = ()
 
     def __init__(self,
                  type_model: type[AbstractModel],
                  session: AsyncSession,
-                 *args, **kwargs):
+                 *args,
+                 uow: UnitOfWork | None = None,
+                 cache: EntityCache | None = None,
+                 use_replica: bool = True,
+                 **kwargs):
         self.type_model = type_model
         self.session = session
+        self.uow = uow
+        self.cache = cache
+        self.use_replica = use_replica
+
+    async def _commit(self):
+        """Коммит, либо только flush, если репозиторий работает внутри открытого unit of work"""
+        if self.uow is not None and self.uow.in_transaction:
+            await self.session.flush()
+        else:
+            await self.session.commit()
+
+    @property
+    def _read_bind_arguments(self) -> dict | None:
+        """
+        Чтения репозитория можно отправить на реплику (если сессия это умеет, см. RoutingSession),
+        кроме чтений внутри открытого unit of work - там операция записи читает свои данные с primary
+        """
+        if not self.use_replica or (self.uow is not None and self.uow.in_transaction):
+            return None
+        return REPLICA_BIND_ARGUMENTS
+
+    async def _commit_write(self, rows: Sequence[Any] | None = None, deleted: bool = False):
+        """
+        Коммит записи со сбросом кэша сущностей.
+
+        :param rows: Записанные строки (объекты или словари значений): сбрасываются только записи
+                     кэша, собранные из этих строк или их родителей (см. row_tags). Без rows (запись
+                     по условию) сбрасывается вся модель
+        :param deleted: Строки удалены: модели cache_invalidates сбрасываются целиком
+
+        Другим воркерам сброс рассылается через NOTIFY в транзакции записи (publish_invalidation).
+        В этом процессе кэш сбрасывается сразу, а внутри unit of work еще раз после коммита, чтобы
+        параллельный запрос не закэшировал строку, прочитанную до коммита
+        """
+        if self.cache is None:
+            await self._commit()
+            return
+
+        # Сначала flush: у новых объектов появляются id
+        await self.session.flush()
+        tables, tags = [], set()
+        if rows is None:
+            tables.append(self.type_model.__table__.name)
+        else:
+            for row in rows:
+                tags |= row_tags(self.type_model, row if isinstance(row, dict) else inspect(row).dict)
+        if deleted:
+            tables.extend(model.__table__.name for model in self.cache_invalidates)
+
+        await publish_invalidation(self.session, self.cache, tables, tags)
+        await self._commit()
+        apply_invalidation(self.cache, tables, tags)
+        if self.uow is not None and self.uow.in_transaction:
+            self.uow.on_commit(lambda: apply_invalidation(self.cache, tables, tags))
+
+    async def _cached_lookup(self, column: str, value: Any, loaders: tuple, load) -> AbstractModel | None:
+        """Поиск одного объекта по ключу через кэш сущностей, load - загрузка из БД при промахе"""
+        if self.cache is None or column not in self.cached_columns:
+            return await load()
+
+        key = self.cache.key(self.type_model, column, value, loaders)
+        version = self.cache.version
+        cached = self.cache.get_entity(key)
+        if cached is not None:
+            # merge без load=True не ходит в БД, а только переносит копию в текущую сессию
+            return await self.session.merge(cached, load=False)
+
+        obj = await load()
+        if obj is not None:
+            self.cache.set_entity(key, obj, version)
+        return obj
 
     @rollback_wrapper
     async def get(self,
                   ident: Any,
-                  selectin_load: list[Any] | None = None) -> AbstractModel | None:
+                  selectin_load: list[Any] | None = None,
+                  loader: LoaderProfile | None = None) -> AbstractModel | None:
         """Get an ONE model from the database with PK.
         
         :param ident: Key which need to find entry in database
         :param selectin_load: List of relationships to load using selectinload
+        :param loader: Named loader profile (see repositories.loaders)
         :return: Model instance or None
         
         Examples:
         - await repo.get(user_id, selectin_load=[User.profile])
-        - await repo.get(user_id, selectin_load=[User.profile, User.wb_accounts])
+        - await repo.get(profile_id, loader=PROFILE_WITH_USER)
         """
-        # Если нужны дополнительные загрузки, используем select с options
-        if selectin_load:
-            statement = select(self.type_model).where(self.type_model.id == ident)
-            
-            for relation in selectin_load:
-                statement = statement.options(selectinload(relation))
-            
-            result = await self.session.execute(statement)
-            return result.scalar_one_or_none()
-        else:
-            # Стандартное поведение для простых запросов
-            return await self.session.get(entity=self.type_model, ident=ident)
+        # Закэшированный select вместо session.get: его можно отправить на реплику
+        return await self.get_by("id", ident, selectin_load=selectin_load, loader=loader)
+
+    def json_contains(self, column: str, value: dict | list):
+        """
+        Условие "JSONB-колонка содержит value" (оператор @>), для whereclause.
+        Использует GIN-индекс jsonb_path_ops по колонке, если он есть.
+
+        Examples:
+        - repo.json_contains("token_metadata", {"scopes": ["content"]})
+        - ~repo.json_contains("token_metadata", {"scopes": ["content"]})  - нет скоупа content
+        """
+        return getattr(self.type_model, column).contains(value)
+
+    def json_path_exists(self, column: str, path: str):
+        """
+        Условие "в JSONB-колонке есть элемент по JSONPath" (оператор @?), для whereclause.
+        Использует GIN-индекс jsonb_path_ops по колонке, если он есть.
+
+        Examples:
+        - repo.json_path_exists("details", "$.warehouse_id")
+        - repo.json_path_exists("token_metadata", '$.scopes[*] ? (@ == "content")')
+        """
+        return getattr(self.type_model, column).path_exists(cast(path, JSONPATH))
+
+    @staticmethod
+    def _with_loaders(statement: Select,
+                      selectin_load: Sequence[Any] | None = None,
+                      loader: LoaderProfile | None = None) -> Select:
+        """Добавляет к запросу загрузку связей: отдельные selectinload и/или профиль загрузки"""
+        for relation in selectin_load or ():
+            statement = statement.options(selectinload(relation))
+        if loader is not None:
+            statement = statement.options(*loader.options)
+        return statement
+
+    def _fieldset_options(self, fields: Sequence[str]) -> list:
+        """
+        Опции загрузки только перечисленных полей модели: колонки через load_only,
+        отношения через selectinload, остальные отношения не загружаются (raiseload).
+        Поле "связь.колонка" загружает связь только с перечисленными колонками (и ее PK),
+        без них связанный объект загружается целиком.
+        Первичный ключ и created_at загружаются всегда - они нужны identity map и курсору страницы
+        """
+        mapper = self.type_model.__mapper__
+        columns = [self.type_model.id, self.type_model.created_at]
+        relations: dict[str, list[str]] = {}
+        for name in fields:
+            name, _, related_column = name.partition(".")
+            if name in mapper.relationships:
+                relations.setdefault(name, [])
+                if related_column:
+                    relations[name].append(related_column)
+            elif name in mapper.column_attrs and not related_column:
+                columns.append(getattr(self.type_model, name))
+            else:
+                raise ValueError(f"{self.type_model.__name__} has no field {name!r}")
+
+        options = []
+        for name, related_columns in relations.items():
+            relation = getattr(self.type_model, name)
+            option = selectinload(relation)
+            if related_columns:
+                target = relation.property.mapper.class_
+                option = option.options(load_only(*(getattr(target, column) for column in related_columns)),
+                                        raiseload("*"))
+            options.append(option)
+        return [load_only(*columns), *options, raiseload("*")]
+
+    def _lookup_statement(self, column: str, selectin_load: tuple, loader: LoaderProfile | None = None) -> Select:
+        """Шаблон запроса по равенству колонки, строится один раз на форму запроса"""
+        key = (self.type_model, column, selectin_load, loader)
+        statement = self._statement_cache.get(key)
+        if statement is None:
+            statement = select(self.type_model).where(getattr(self.type_model, column) == bindparam("value"))
+            statement = self._with_loaders(statement, selectin_load, loader)
+            self._statement_cache[key] = statement
+        return statement
+
+    @rollback_wrapper
+    async def get_by(self,
+                     column: str,
+                     value: Any,
+                     many: bool = False,
+                     selectin_load: list[Any] | None = None,
+                     loader: LoaderProfile | None = None) -> Sequence[AbstractModel] | AbstractModel | None:
+        """Get models by equality of one column using a cached statement.
+
+        Для горячих поисков (профиль по user_id, кабинеты по profile_id, кабинет по id)
+        select не собирается заново на каждый вызов: шаблон с bindparam строится один раз,
+        а его ключ кэша скомпилированных запросов SQLAlchemy мемоизирован в самом объекте.
+
+        :param column: Name of the model column to compare with value
+        :param value: Value of the column
+        :param many: Return all matched models instead of one
+        :param selectin_load: List of relationships to load using selectinload
+        :param loader: Named loader profile (see repositories.loaders)
+        :return: Model (or list of models if many) or None
+
+        Examples:
+        - await repo.get_by("user_id", user_id, loader=PROFILE_WITH_USER)
+        - await repo.get_by("profile_id", profile_id, many=True, loader=ACCOUNT_LIST)
+        """
+        selectin_load = tuple(selectin_load or ())
+        statement = self._lookup_statement(column, selectin_load, loader)
+
+        async def load():
+            result = await self.session.execute(statement, {"value": value},
+                                                bind_arguments=self._read_bind_arguments)
+            return result.scalars().all() if many else result.scalar_one_or_none()
+
+        if many:
+            return await load()
+        return await self._cached_lookup(column, value, (selectin_load, loader), load)
 
     @rollback_wrapper
     async def get_where(self,
@@ -68,7 +271,9 @@ class BaseDBRepository(Generic[AbstractModel]):
                         group_by=None,
                         order_by=None,
                         columns: list[Any] | None = None,
-                        selectin_load: list[Any] | None = None) -> Union[Sequence[AbstractModel], AbstractModel, Sequence[tuple], tuple, Sequence[Any], Any, None]:
+                        selectin_load: list[Any] | None = None,
+                        fields: Sequence[str] | None = None,
+                        loader: LoaderProfile | None = None) -> Union[Sequence[AbstractModel], AbstractModel, Sequence[tuple], tuple, Sequence[Any], Any, None]:
         """Get an ONE model from the database with whereclause.
         :param offset:
         :param many:
@@ -82,6 +287,11 @@ class BaseDBRepository(Generic[AbstractModel]):
                        - [Model.id, Model.name] - получить поля id и name
                        - [func.count(Model.id)] - получить количество записей
         :param selectin_load: List of relationships to load using selectinload
+        :param fields: Names of model fields to load (sparse fieldset). Other columns are not
+                       read from the database, other relationships are not loaded.
+                       Examples:
+                       - ["name", "status"] - модели только с id, created_at, name и status
+        :param loader: Named loader profile (see repositories.loaders)
         :return: Model if only one model was found, else None.
                 If columns specified, returns selected column values or tuples.
         """
@@ -103,11 +313,12 @@ class BaseDBRepository(Generic[AbstractModel]):
             statement = statement.group_by(group_by)
 
         # Добавляем загрузку связанных моделей только если не указаны отдельные columns
-        if columns is None and selectin_load:
-            for relation in selectin_load:
-                statement = statement.options(selectinload(relation))
+        if columns is None:
+            statement = self._with_loaders(statement, selectin_load, loader)
+        if columns is None and fields is not None:
+            statement = statement.options(*self._fieldset_options(fields))
 
-        result = await self.session.execute(statement)
+        result = await self.session.execute(statement, bind_arguments=self._read_bind_arguments)
         
         # Если выбираем отдельные поля, возвращаем кортежи или отдельные значения
         if columns is not None:
@@ -121,6 +332,163 @@ class BaseDBRepository(Generic[AbstractModel]):
             # Если выбираем всю модель, возвращаем объекты модели
             return result.scalars().all() if many else result.scalar_one_or_none()
 
+    @rollback_wrapper
+    async def get_page(self,
+                       limit: int,
+                       cursor: str | None = None,
+                       whereclause=None,
+                       selectin_load: list[Any] | None = None,
+                       fields: Sequence[str] | None = None,
+                       loader: LoaderProfile | None = None,
+                       columns: Sequence[Any] | None = None) -> tuple[Sequence[AbstractModel], str | None]:
+        """Get a page of models using keyset (cursor) pagination by (created_at, id).
+
+        В отличие от offset стоимость запроса не зависит от глубины страницы:
+        база сразу переходит по индексу (created_at, id) к позиции курсора.
+
+        :param limit: Number of elements per page
+        :param cursor: Opaque cursor from the previous page (`next_cursor`), None for the first page
+        :param whereclause: Clause by which entries will be filtered
+        :param selectin_load: List of relationships to load using selectinload
+        :param fields: Names of model fields to load (sparse fieldset), see `get_where`
+        :param loader: Named loader profile (see repositories.loaders)
+        :param columns: Columns to select instead of models (no ORM objects and relationships).
+                Rows are returned; created_at and id are always selected for the cursor
+        :return: Models (or rows) of the page and cursor of the next page (None if the page is the last one)
+        :raises InvalidCursorError: if the cursor cannot be decoded
+
+        Examples:
+        - items, next_cursor = await repo.get_page(limit=50)
+        - items, next_cursor = await repo.get_page(limit=50, cursor=next_cursor)
+        - rows, next_cursor = await repo.get_page(limit=50, columns=[User.id, User.email])
+        """
+        order_columns = (self.type_model.created_at, self.type_model.id)
+
+        if columns is not None:
+            missing = [column for column in order_columns if not any(column is selected for selected in columns)]
+            statement = select(*columns, *missing)
+        else:
+            statement = select(self.type_model)
+        if whereclause is not None:
+            statement = statement.where(whereclause)
+        if cursor is not None:
+            statement = statement.where(tuple_(*order_columns) > decode_cursor(cursor))
+
+        # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+        statement = statement.order_by(*order_columns).limit(limit + 1)
+
+        if columns is None:
+            statement = self._with_loaders(statement, selectin_load, loader)
+        if columns is None and fields is not None:
+            statement = statement.options(*self._fieldset_options(fields))
+
+        result = await self.session.execute(statement, bind_arguments=self._read_bind_arguments)
+        items = result.all() if columns is not None else result.scalars().all()
+
+        if len(items) <= limit:
+            return items, None
+
+        items = items[:limit]
+        return items, encode_cursor(items[-1].created_at, items[-1].id)
+
+    @rollback_wrapper
+    async def count(self,
+                    whereclause=None,
+                    mode: CountMode = CountMode.EXACT,
+                    cap: int | None = None) -> int:
+        """Count entries for list totals.
+
+        - EXACT - SELECT count(*), стоимость растет вместе с таблицей;
+        - CAPPED - считает не больше cap строк: count(*) по подзапросу с LIMIT, результат cap
+          означает "cap или больше";
+        - ESTIMATED - без whereclause берет pg_class.reltuples таблицы, с whereclause - оценку
+          строк из EXPLAIN. Не читает таблицу, но точна настолько, насколько свежа статистика
+          (после ANALYZE/autovacuum).
+
+        :param whereclause: Clause by which entries will be filtered
+        :param mode: Counting mode
+        :param cap: Limit for CAPPED mode, `count_cap` by default
+        :return: Number of entries (exact, capped or estimated)
+
+        Examples:
+        - await repo.count()
+        - await repo.count(WBAccountModel.profile_id == profile_id, mode=CountMode.CAPPED, cap=500)
+        """
+        if mode == CountMode.ESTIMATED:
+            return await self._estimate_count(whereclause)
+
+        statement = select(literal(1)).select_from(self.type_model)
+        if whereclause is not None:
+            statement = statement.where(whereclause)
+        if mode == CountMode.CAPPED:
+            statement = statement.limit(cap or self.count_cap)
+
+        result = await self.session.execute(select(func.count()).select_from(statement.subquery()),
+                                            bind_arguments=self._read_bind_arguments)
+        return result.scalar_one()
+
+    async def _estimate_count(self, whereclause=None) -> int:
+        if whereclause is None:
+            statement = text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)")
+            result = await self.session.execute(statement, {"table": self.type_model.__table__.fullname},
+                                                bind_arguments=self._read_bind_arguments)
+            estimate = result.scalar_one_or_none()
+            # -1, если таблицу еще ни разу не анализировали: статистики нет, считаем с пределом
+            if estimate is None or estimate < 0:
+                return await self.count(mode=CountMode.CAPPED)
+            return estimate
+
+        statement = select(literal(1)).select_from(self.type_model).where(whereclause)
+        connection = await self.session.connection(bind_arguments=self._read_bind_arguments)
+        # Параметры раскрываются (IN) и приводятся к виду драйвера, как при обычном execute
+        expanded = statement.compile(dialect=connection.dialect).construct_expanded_state()
+        values = tuple(expanded.processors[name](value) if name in expanded.processors else value
+                       for name, value in zip(expanded.positiontup, expanded.positional_parameters))
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {expanded.statement}", values)
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def stream_where(self,
+                           whereclause=None,
+                           order_by=None,
+                           selectin_load: list[Any] | None = None,
+                           chunk_size: int | None = None,
+                           loader: LoaderProfile | None = None) -> AsyncIterator[AbstractModel]:
+        """Stream models from the database with whereclause without loading the whole result set.
+
+        Строки читаются серверным курсором пачками по chunk_size (yield_per), поэтому
+        память на запрос не растет вместе с таблицей, а первая строка отдается сразу.
+
+        :param whereclause: Clause by which entries will be filtered
+        :param order_by: Name of field for ordering
+        :param selectin_load: List of relationships to load using selectinload (per chunk)
+        :param chunk_size: Number of rows fetched per round trip, `stream_chunk_size` by default
+        :param loader: Named loader profile (see repositories.loaders)
+        :return: Async iterator over model instances
+
+        Examples:
+        - async for account in repo.stream_where(whereclause=WBAccountModel.status == 1): ...
+        """
+        statement = select(self.type_model)
+        if whereclause is not None:
+            statement = statement.where(whereclause)
+        if order_by is not None:
+            statement = statement.order_by(order_by)
+        statement = self._with_loaders(statement, selectin_load, loader)
+
+        statement = statement.execution_options(yield_per=chunk_size or self.stream_chunk_size)
+
+        # rollback_wrapper не подходит для асинхронных генераторов, откатываем вручную
+        try:
+            result = await self.session.stream(statement, bind_arguments=self._read_bind_arguments)
+            async for obj in result.scalars():
+                yield obj
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            raise e
+
     @rollback_wrapper
     async def delete(
         self,
@@ -149,13 +517,13 @@ class BaseDBRepository(Generic[AbstractModel]):
                     await self.session.delete(obj_item)
             else:
                 await self.session.delete(obj)
-            await self.session.commit()
+            await self._commit_write(obj if many and isinstance(obj, Sequence) else [obj], deleted=True)
             return len(obj) if many and isinstance(obj, Sequence) else 1
         elif whereclause is not None:
             # Удаление по условию (новая функциональность)
             stmt = delete(self.type_model).where(whereclause)
             result = await self.session.execute(stmt)
-            await self.session.commit()
+            await self._commit_write(deleted=True)
             return result.rowcount
         else:
             raise ValueError("Either 'obj' or 'whereclause' must be provided")
@@ -164,12 +532,19 @@ class BaseDBRepository(Generic[AbstractModel]):
     async def save(
         self,
         obj: AbstractModel | Sequence[AbstractModel],
-        many: bool = False
+        many: bool = False,
+        refresh: bool = True,
+        loader: LoaderProfile | None = None,
     ) -> AbstractModel | Sequence[AbstractModel]:
         """
 
         :param obj: object or objects to save
         :param many: flag for many saves
+        :param refresh: reload objects (with relationships) after commit.
+                        Server defaults and onupdate values are fetched by RETURNING
+                        during flush anyway (eager_defaults), so pass False when
+                        relationships of the saved objects are not needed
+        :param loader: Loader profile for the refresh, see `refresh`
         :return:
         """
         if many:
@@ -177,8 +552,219 @@ class BaseDBRepository(Generic[AbstractModel]):
         else:
             self.session.add(obj)
 
-        await self.session.commit()
-        return await self.refresh(obj, many)
+        await self._commit_write(obj if many else [obj])
+
+        if not refresh:
+            return obj
+        return await self.refresh(obj, many, loader=loader)
+
+    @rollback_wrapper
+    async def insert(self, values: dict[str, Any]) -> AbstractModel:
+        """
+        Создание одной записи через INSERT ... RETURNING.
+
+        Серверные значения по умолчанию приходят в том же запросе, без refresh после коммита.
+        Связи у возвращенного объекта не загружены.
+
+        :param values: Значения колонок (название колонки -> значение)
+        :return: Созданный объект
+
+        Examples:
+        - await repo.insert({"profile_id": profile_id, "name": "Кабинет", "wb_token": token})
+        """
+        statement = insert(self.type_model).values(values).returning(self.type_model)
+        result = await self.session.scalars(statement, execution_options={"populate_existing": True})
+        obj = result.one()
+        await self._commit_write([obj])
+        return obj
+
+    @rollback_wrapper
+    async def update_one(
+        self,
+        ident: Any,
+        values: dict[str, Any],
+    ) -> AbstractModel | None:
+        """
+        Обновление одной записи по PK через UPDATE ... RETURNING.
+
+        onupdate значения (updated_at) и остальные колонки приходят в том же запросе,
+        без предварительного get и refresh после коммита. Связи у возвращенного объекта
+        загружены, только если объект уже был в сессии.
+
+        :param ident: PK записи
+        :param values: Новые значения колонок (название колонки -> значение)
+        :return: Обновленный объект или None, если записи нет
+
+        Examples:
+        - await repo.update_one(account_id, {"status": WBAccountStatus.ACTIVE.value})
+        """
+        statement = (
+            update(self.type_model)
+            .where(self.type_model.id == ident)
+            .values(values)
+            .returning(self.type_model)
+        )
+        result = await self.session.scalars(statement, execution_options={"populate_existing": True})
+        obj = result.one_or_none()
+        await self._commit_write([{**values, "id": ident}])
+        return obj
+
+    @rollback_wrapper
+    async def delete_by_ids(
+        self,
+        ids: Sequence[Any],
+        whereclause=None,
+    ) -> Sequence[Any]:
+        """
+        Удаление записей по PK одним DELETE ... RETURNING id, без загрузки объектов.
+
+        Связанные записи удаляются каскадом внешних ключей (ondelete='CASCADE') в БД,
+        объекты в сессии не синхронизируются.
+
+        :param ids: PK записей для удаления
+        :param whereclause: Дополнительное условие (например, принадлежность профилю)
+        :return: PK фактически удаленных записей
+
+        Examples:
+        - await repo.delete_by_ids([account_id])
+        - await repo.delete_by_ids(ids, whereclause=WBAccountModel.profile_id == profile_id)
+        """
+        if not ids:
+            return []
+
+        statement = delete(self.type_model).where(self.type_model.id.in_(ids))
+        if whereclause is not None:
+            statement = statement.where(whereclause)
+        statement = statement.returning(self.type_model.id)
+
+        result = await self.session.execute(statement, execution_options={"synchronize_session": False})
+        deleted = result.scalars().all()
+        await self._commit_write([{"id": ident} for ident in deleted], deleted=True)
+        return deleted
+
+    @rollback_wrapper
+    async def copy_insert(self, values: Sequence[dict[str, Any]]) -> int:
+        """
+        Массовая вставка через COPY (asyncpg copy_records_to_table) в транзакции сессии.
+
+        В разы быстрее INSERT на тысячах строк, но без ON CONFLICT и RETURNING: конфликт
+        уникального ключа прерывает всю вставку. Python-значения по умолчанию (default=) не
+        применяются, для непереданных колонок срабатывают только server_default.
+        Все словари в values должны иметь одинаковый набор ключей.
+
+        :param values: Строки для вставки (название колонки -> значение)
+        :return: Количество вставленных строк
+        :raises IntegrityError: при нарушении ограничения (например, уникальности)
+
+        Examples:
+        - await repo.copy_insert([{"id": uuid7(), "user_id": user_id}])
+        """
+        if not values:
+            return 0
+
+        table = self.type_model.__table__
+        columns = list(values[0])
+        connection = await self.session.connection()
+        # Адаптер asyncpg открывает транзакцию лениво, на первом запросе через курсор. COPY идет
+        # мимо курсора и на "чистом" соединении выполнился бы в autocommit, вне транзакции сессии
+        await connection.execute(select(literal(1)))
+        raw_connection = await connection.get_raw_connection()
+        try:
+            await raw_connection.driver_connection.copy_records_to_table(
+                table.name,
+                schema_name=table.schema,
+                columns=columns,
+                records=[tuple(row[column] for column in columns) for row in values],
+            )
+        except asyncpg.IntegrityConstraintViolationError as e:
+            # Ошибки драйвера в обход SQLAlchemy: заворачиваем, чтобы rollback_wrapper откатил сессию
+            raise IntegrityError(f"COPY {table.name}", None, e) from e
+        except asyncpg.PostgresError as e:
+            raise DBAPIError(f"COPY {table.name}", None, e) from e
+
+        await self._commit_write(values)
+
+        return len(values)
+
+    @rollback_wrapper
+    async def bulk_upsert(
+        self,
+        values: Sequence[dict[str, Any]],
+        index_elements: Sequence[str] = ("id",),
+        update_columns: Sequence[str] | None = None,
+        conflict_where=None,
+        chunk_size: int | None = None,
+    ) -> list[AbstractModel]:
+        """
+        Массовая вставка/обновление через INSERT ... ON CONFLICT DO UPDATE ... RETURNING.
+
+        Каждая пачка из chunk_size строк - один запрос, сохраненные строки возвращаются
+        из RETURNING, без refresh по каждому объекту. Все словари в values должны иметь
+        одинаковый набор ключей, а ключ конфликта не должен повторяться внутри values.
+
+        :param values: Строки для сохранения (название колонки -> значение)
+        :param index_elements: Колонки уникального индекса, по которому определяется конфликт
+        :param update_columns: Колонки, которые обновляются при конфликте.
+                               По умолчанию все переданные, кроме колонок конфликта
+        :param conflict_where: Условие, при котором существующая строка обновляется.
+                               Строки, не прошедшие условие, не изменяются и не возвращаются
+        :param chunk_size: Размер пачки, по умолчанию `upsert_chunk_size`
+        :return: Сохраненные объекты
+
+        Examples:
+        - await repo.bulk_upsert([{"user_id": user_id}], index_elements=["user_id"])
+        - await repo.bulk_upsert(rows, conflict_where=WBAccountModel.profile_id == profile_id)
+        """
+        if not values:
+            return []
+
+        chunk_size = chunk_size or self.upsert_chunk_size
+        if update_columns is None:
+            update_columns = [key for key in values[0] if key not in index_elements and key != "id"]
+
+        saved = []
+        for start in range(0, len(values), chunk_size):
+            statement = pg_insert(self.type_model).values(list(values[start:start + chunk_size]))
+
+            set_ = {column: statement.excluded[column] for column in update_columns}
+            if "updated_at" in self.type_model.__table__.c:
+                # Заодно гарантирует непустой SET, чтобы RETURNING вернул и существующие строки
+                set_["updated_at"] = func.now()
+
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_=set_,
+                where=conflict_where,
+            ).returning(self.type_model)
+
+            result = await self.session.scalars(statement, execution_options={"populate_existing": True})
+            saved.extend(result.all())
+
+        await self._commit_write(saved)
+
+        return saved
+
+    @rollback_wrapper
+    async def bulk_update(self, values: Sequence[dict[str, Any]]) -> int:
+        """
+        Массовое обновление разных значений по PK одним UPDATE ... WHERE id = :id,
+        выполненным пачкой (executemany, asyncpg отправляет все строки за один обмен).
+
+        onupdate значения (updated_at) проставляются, как у обычного UPDATE. Все словари
+        в values должны иметь одинаковый набор ключей и ключ "id".
+
+        :param values: Строки для обновления (название колонки -> значение, вместе с "id")
+        :return: Количество переданных строк
+
+        Examples:
+        - await repo.bulk_update([{"id": account_id, "status": WBAccountStatus.ACTIVE.value}])
+        """
+        if not values:
+            return 0
+
+        await self.session.execute(update(self.type_model), list(values))
+        await self._commit_write(values)
+        return len(values)
 
     @rollback_wrapper
     async def update(
@@ -192,14 +778,26 @@ class BaseDBRepository(Generic[AbstractModel]):
             .values(values)
         )
         result = await self.session.execute(stmt)
-        await self.session.commit()
+        await self._commit_write()
         return result.rowcount
 
     @rollback_wrapper
     async def refresh(
             self,
             obj: AbstractModel | Sequence[AbstractModel],
-            many: bool = False):
+            many: bool = False,
+            loader: LoaderProfile | None = None):
+        """
+        Перечитывает объекты из БД. session.refresh не загружает ленивые связи,
+        поэтому с профилем загрузки объекты перечитываются select'ом с populate_existing
+        """
+        if loader is not None:
+            objs = obj if many else [obj]
+            statement = self._with_loaders(select(self.type_model), loader=loader)
+            statement = statement.where(self.type_model.id.in_([item.id for item in objs]))
+            await self.session.execute(statement.execution_options(populate_existing=True))
+            return obj
+
         if many:
             for obj_item in obj:
                 await self.session.refresh(obj_item)
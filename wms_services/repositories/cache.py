@@ -0,0 +1,271 @@
+import hashlib
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable
+
+from sqlalchemy import inspect
+
+__all__ = ["TTLCache", "EntityCache", "PrincipalCache", "TokenMetadataCache", "entity_tags", "row_tags"]
+
+_MISSING = object()
+
+
+def row_tags(model: type, values: dict[str, Any]) -> set[tuple[str, str]]:
+    """
+    Строки БД, записи кэша которых устаревают при записи строки values модели model:
+    сама строка (если известен id) и родители по внешним ключам из values (их загруженные
+    связи-коллекции могут не содержать новую строку)
+    """
+    table = model.__table__
+    tags = set()
+    if values.get("id") is not None:
+        tags.add((table.name, str(values["id"])))
+    for column in table.columns:
+        value = values.get(column.key)
+        if value is not None:
+            for foreign_key in column.foreign_keys:
+                tags.add((foreign_key.column.table.name, str(value)))
+    return tags
+
+
+def entity_tags(obj: Any) -> set[tuple[str, str]]:
+    """Строки БД, из которых собран объект: он сам, родители по внешним ключам и загруженные связи"""
+    tags = set()
+    seen = set()
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        state = inspect(item)
+        tags |= row_tags(state.mapper.class_, state.dict)
+        for relationship in state.mapper.relationships:
+            # Только уже загруженные связи: обращение к остальным пошло бы в БД
+            value = state.dict.get(relationship.key)
+            if value is None:
+                continue
+            pending.extend(value if relationship.uselist else [value])
+    return tags
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру кэш в памяти процесса с TTL и вытеснением LRU.
+
+    Считает попадания, промахи и вытеснения, чтобы по ним подбирать размер и TTL.
+    Не потокобезопасен: рассчитан на один event loop на процесс.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """
+        :param ttl: TTL записи в секундах, по умолчанию общий TTL кэша
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class EntityCache(TTLCache):
+    """
+    Кэш ORM-объектов для поисков репозиториев по первичному и уникальным ключам.
+
+    Хранятся отвязанные от сессии копии объектов (вместе с загруженными связями),
+    поэтому изменения объекта в запросе не попадают в кэш. Каждая запись помечена строками БД
+    (таблица, id), из которых собрана: сам объект, объекты в загруженных связях и родители по
+    внешним ключам. Запись строки сбрасывает только помеченные ею записи кэша (invalidate_rows),
+    запись по условию без известных строк - всю модель через поколение (invalidate).
+
+    Кэш в памяти процесса, а сбросы рассылаются остальным воркерам через PostgreSQL NOTIFY
+    (см. cache_sync) в транзакции записи. Если задан channel, кэш не отдает и не сохраняет
+    записи, пока воркер не слушает канал (available): пропущенный сброс иначе оставил бы
+    устаревшую копию до TTL.
+    """
+
+    def __init__(self, max_size: int, ttl: float, channel: str | None = None):
+        super().__init__(max_size, ttl)
+        self.channel = channel
+        self.available = channel is None
+        self._generations: dict[str, int] = {}
+        # Строка БД -> ключи записей кэша, собранных из нее
+        self._tagged: dict[tuple[str, str], set[Hashable]] = {}
+        # Растет при каждом сбросе: чтение из БД, во время которого был сброс, не кэшируется
+        self.version = 0
+        self.row_invalidations = 0
+        # Кэши, записи которых собраны из тех же строк (PrincipalCache)
+        self.dependents: list["PrincipalCache"] = []
+
+    def generation(self, model: type) -> int:
+        return self._generations.get(model.__table__.name, 0)
+
+    def key(self, model: type, column: str, value: Any, loaders: tuple = ()) -> tuple:
+        return model, self.generation(model), column, value, loaders
+
+    def get_entity(self, key: tuple) -> Any:
+        if not self.available:
+            return None
+        snapshot = self.get(key)
+        return None if snapshot is None else pickle.loads(snapshot)
+
+    def set_entity(self, key: tuple, obj: Any, version: int):
+        """
+        :param version: self.version до чтения obj из БД: если с тех пор был сброс, obj
+                        мог быть прочитан до записи и не кэшируется
+        """
+        if not self.available or version != self.version:
+            return
+        self.set(key, pickle.dumps(obj))
+        self.tag(key, entity_tags(obj))
+
+    def tag(self, key: Hashable, tags: set[tuple[str, str]]):
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        # Ключи, ушедшие по LRU/TTL, остаются в индексе: время от времени он пересобирается
+        if len(self._tagged) > 4 * self.max_size:
+            live = {key for cache in (self, *self.dependents) for key in cache._data}
+            self._tagged = {tag: keys & live for tag, keys in self._tagged.items() if keys & live}
+
+    def invalidate(self, *models: type):
+        self.invalidate_tables(model.__table__.name for model in models)
+
+    def invalidate_tables(self, tables: Iterable[str]):
+        for table in tables:
+            self._generations[table] = self._generations.get(table, 0) + 1
+        self.version += 1
+
+    def invalidate_rows(self, tags: Iterable[tuple[str, str]]):
+        self.version += 1
+        for tag in tags:
+            for key in self._tagged.pop(tag, ()):
+                self.row_invalidations += 1
+                self.delete(key)
+                for cache in self.dependents:
+                    cache.delete(key)
+
+    def clear(self):
+        super().clear()
+        self._tagged.clear()
+        self.version += 1
+        for cache in self.dependents:
+            cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {**super().stats(),
+                "available": self.available,
+                "invalidations": sum(self._generations.values()),
+                "row_invalidations": self.row_invalidations}
+
+
+class PrincipalCache(TTLCache):
+    """
+    Кэш аутентифицированных пользователей (вместе с профилем) по id пользователя.
+
+    Как и EntityCache, хранит отвязанные копии объектов. Записи помечаются строками БД в
+    индексе entity_cache, а ключ включает поколения моделей depends_on, поэтому запись в
+    пользователя или профиль, которая сбрасывает EntityCache, сбрасывает и закэшированных пользователей,
+    в том числе в других воркерах (NOTIFY, см. cache_sync). Пока воркер не слушает сбросы,
+    кэш не используется: деактивированный или разжалованный пользователь не пройдет по старой копии.
+    """
+
+    def __init__(self, max_size: int, ttl: float, entity_cache: EntityCache, depends_on: tuple[type, ...] = ()):
+        super().__init__(max_size, ttl)
+        self.entity_cache = entity_cache
+        self.depends_on = depends_on
+        entity_cache.dependents.append(self)
+
+    def key(self, ident: Any) -> tuple:
+        """
+        Ключ берется до чтения из БД и с ним же сохраняется результат: если во время чтения
+        была запись, прочитанная копия ляжет под устаревшим поколением и не будет найдена
+        """
+        return ident, tuple(self.entity_cache.generation(model) for model in self.depends_on)
+
+    @property
+    def version(self) -> int:
+        return self.entity_cache.version
+
+    def get_principal(self, key: tuple) -> Any:
+        if not self.entity_cache.available:
+            return None
+        snapshot = self.get(key)
+        return None if snapshot is None else pickle.loads(snapshot)
+
+    def set_principal(self, key: tuple, obj: Any, version: int):
+        """:param version: self.version до чтения obj из БД (см. EntityCache.set_entity)"""
+        if not self.entity_cache.available or version != self.version:
+            return
+        self.set(key, pickle.dumps(obj))
+        self.entity_cache.tag(key, entity_tags(obj))
+
+
+class TokenMetadataCache(TTLCache):
+    """
+    Результаты разбора токенов маркетплейса (декодирование и проверка доступов) по хешу токена.
+
+    Все, что проверяется без сети, определяется самим токеном, поэтому результат не устаревает,
+    пока токен действует: запись живет до exp токена, а TTL кэша применяется к токенам без exp
+    и к некорректным токенам. Сами токены в памяти не хранятся - ключ это sha256 токена.
+    Как и EntityCache, хранит копии: мета-данные токена дальше попадают в ORM-объекты.
+    """
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get_token(self, token: str) -> Any:
+        snapshot = self.get(self.key(token))
+        return None if snapshot is None else pickle.loads(snapshot)
+
+    def set_token(self, token: str, value: Any, expires_at: float | None = None):
+        """
+        :param expires_at: exp токена (unix time), по умолчанию запись живет TTL кэша
+        """
+        ttl = None if expires_at is None else expires_at - time.time()
+        if ttl is not None and ttl <= 0:
+            return
+        self.set(self.key(token), pickle.dumps(value), ttl=ttl)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+from typing import Any, Iterable
+
+from loguru import logger
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from wms_services.repositories.cache import EntityCache
+
+__all__ = ["publish_invalidation", "apply_invalidation", "listen_invalidations"]
+
+# Строк в одном NOTIFY: полезная нагрузка PostgreSQL ограничена 8000 байт
+_ROWS_PER_MESSAGE = 100
+
+
+def apply_invalidation(cache: EntityCache, tables: Iterable[str] = (), rows: Iterable[tuple[str, str]] = ()):
+    """Сброс в кэше этого процесса: таблицы целиком (по поколению) и отдельные строки"""
+    tables, rows = list(tables), list(rows)
+    if tables:
+        cache.invalidate_tables(tables)
+    if rows:
+        cache.invalidate_rows(rows)
+
+
+async def publish_invalidation(session: AsyncSession,
+                               cache: EntityCache,
+                               tables: Iterable[str] = (),
+                               rows: Iterable[tuple[str, str]] = ()):
+    """
+    Рассылает сброс кэша остальным воркерам через NOTIFY в текущей транзакции сессии.
+
+    PostgreSQL доставляет уведомления только после коммита (и не доставляет при откате),
+    поэтому воркеры сбрасывают кэш, когда запись уже видна. Вызывается до коммита записи.
+    """
+    tables, rows = sorted(set(tables)), sorted(set(rows))
+    if cache.channel is None or not (tables or rows):
+        return
+
+    messages: list[dict[str, Any]] = [{"tables": tables, "rows": rows[:_ROWS_PER_MESSAGE]}]
+    for start in range(_ROWS_PER_MESSAGE, len(rows), _ROWS_PER_MESSAGE):
+        messages.append({"tables": [], "rows": rows[start:start + _ROWS_PER_MESSAGE]})
+
+    payloads = [json.dumps(message, separators=(",", ":")) for message in messages]
+    await session.execute(select(*(func.pg_notify(cache.channel, payload) for payload in payloads)))
+
+
+async def listen_invalidations(engine: AsyncEngine, cache: EntityCache, check_interval: float):
+    """
+    Слушает сбросы кэша от всех воркеров (в том числе своих) на отдельном соединении, пока воркер жив.
+
+    Пока соединения нет, кэш недоступен (EntityCache.available), а после (пере)подключения
+    очищается целиком: уведомления, отправленные без слушателя, потеряны.
+    """
+
+    def on_notification(connection, pid, channel, payload):
+        message = json.loads(payload)
+        apply_invalidation(cache, message["tables"], (tuple(row) for row in message["rows"]))
+
+    while True:
+        try:
+            async with engine.connect() as connection:
+                await connection.execution_options(isolation_level="AUTOCOMMIT")
+                raw_connection = await connection.get_raw_connection()
+                await raw_connection.driver_connection.add_listener(cache.channel, on_notification)
+                cache.clear()
+                cache.available = True
+                logger.info(f"Listening to entity cache invalidations on {cache.channel!r}.")
+                try:
+                    while True:
+                        await asyncio.sleep(check_interval)
+                        # Оборвавшееся соединение - уведомления могли потеряться
+                        await connection.execute(text("SELECT 1"))
+                finally:
+                    cache.available = False
+                    await connection.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Entity cache invalidation listener failed: {e}")
+        await asyncio.sleep(check_interval)
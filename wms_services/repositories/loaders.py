@@ -0,0 +1,39 @@
+from dataclasses import dataclass, field
+
+from sqlalchemy.orm import joinedload, raiseload
+
+from wms_services.models import User, ProfileModel
+
+__all__ = ["LoaderProfile", "AUTH_PRINCIPAL", "PROFILE_WITH_USER", "ACCOUNT_LIST"]
+
+
+@dataclass(frozen=True)
+class LoaderProfile:
+    """
+    Именованный набор опций загрузки связей для запроса.
+
+    Связи моделей по умолчанию не загружаются (lazy="raise_on_sql"), поэтому запрос
+    явно выбирает профиль под схему ответа. Сравнивается и хэшируется по имени - имя
+    входит в ключи кэша запросов и кэша сущностей.
+    """
+    name: str
+    options: tuple = field(default=(), compare=False, hash=False, repr=False)
+
+
+# Пользователь для аутентификации: только профиль, без кабинетов
+AUTH_PRINCIPAL = LoaderProfile("auth_principal", (
+    joinedload(User.profile).raiseload("*"),
+))
+
+# Профиль для ProfileResponseSchema: ФИО пользователя, без кабинетов
+PROFILE_WITH_USER = LoaderProfile("profile_with_user", (
+    joinedload(ProfileModel.user, innerjoin=True)
+    .load_only(User.first_name, User.second_name, User.last_name)
+    .raiseload("*"),
+    raiseload("*"),
+))
+
+# Кабинеты для ResponseWBAccountSchema: только колонки кабинета
+ACCOUNT_LIST = LoaderProfile("account_list", (
+    raiseload("*"),
+))
@@ -0,0 +1,47 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
+from enum import Enum
+
+from wms_services.exceptions.pagination_exceptions import InvalidCursorError
+
+__all__ = ["encode_cursor", "decode_cursor", "CountMode"]
+
+
+class CountMode(str, Enum):
+    """Способ подсчета общего количества записей для списков"""
+    EXACT = "exact"  # точный count(*), дорогой на больших таблицах
+    CAPPED = "capped"  # точный, но не больше заданного предела
+    ESTIMATED = "estimated"  # оценка планировщика (pg_class.reltuples или EXPLAIN)
+
+
+def encode_cursor(created_at: datetime.datetime, ident: uuid.UUID) -> str:
+    """
+    Упаковывает позицию последней записи страницы в непрозрачный курсор.
+    :param created_at: Дата создания последней записи
+    :param ident: ID последней записи
+    :return: base64url-строка без паддинга
+    """
+    raw = json.dumps([created_at.isoformat(), str(ident)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, uuid.UUID]:
+    """
+    Распаковывает курсор, полученный от клиента.
+    :param cursor: Значение `next_cursor` из предыдущей страницы
+    :return: (created_at, id) последней записи предыдущей страницы
+    :raises InvalidCursorError: если курсор поврежден или подделан
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Курсор приходит от клиента: до разбора проверяем, что это именно [str, str]
+        if not (isinstance(payload, list) and len(payload) == 2 and all(isinstance(v, str) for v in payload)):
+            raise InvalidCursorError
+        created_at, ident = payload
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(ident)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise InvalidCursorError
@@ -1,11 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from wms_services.models import ProfileModel
+from wms_services.models import ProfileModel, WBAccountModel
 from wms_services.repositories.base_repo import BaseDBRepository
 
 __all__ = ["ProfileDBRepository"]
 
 class ProfileDBRepository(BaseDBRepository[ProfileModel]):
+    cached_columns = ("id", "user_id")
+    # Удаление профиля каскадно удаляет его кабинеты в БД
+    cache_invalidates = (WBAccountModel,)
 
     def __init__(self,
                  session: AsyncSession,
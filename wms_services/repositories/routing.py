@@ -0,0 +1,116 @@
+import hashlib
+import hmac
+import itertools
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import Insert, Update, Delete
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+__all__ = ["ReplicaRouter", "RoutingSession", "ReadAfterWrite", "read_after_write", "ROUTER_INFO_KEY",
+           "REPLICA_BIND_ARGUMENTS"]
+
+# Ключ session.info, под которым sessionmaker передает роутер в каждую сессию
+ROUTER_INFO_KEY = "replica_router"
+# bind_arguments, которыми репозиторий помечает запрос как допускающий чтение с реплики
+REPLICA_BIND_ARGUMENTS = {"replica": True}
+
+
+
+@dataclass
+class ReadAfterWrite:
+    """
+    Правило "после записи читаем с primary" для одного HTTP запроса.
+
+    primary_until приходит от клиента (подписанная метка его последней записи, см.
+    ReplicaRouter.marker), wrote - запрос сам что-то записал и клиенту нужно выдать новую метку.
+    Метка хранится у клиента, поэтому правило работает, на какой бы воркер ни попал следующий запрос
+    """
+    primary_until: float = 0.0
+    wrote: bool = False
+
+
+# Состояние текущего запроса, задается middleware (src/api/read_after_write.py).
+# Вне запроса (фоновые задачи) не задано, и чтения с пометкой реплики идут на реплику
+read_after_write: ContextVar[ReadAfterWrite | None] = ContextVar("read_after_write", default=None)
+
+
+class ReplicaRouter:
+    """
+    Выбор движка для запроса: запись - primary, чтение - реплики по кругу.
+
+    После записи клиент получает подписанную метку "читать с primary до" (marker) на
+    sticky_seconds и возвращает ее со следующими запросами: они видят свою запись, даже если
+    реплика отстает, на каком бы воркере ни выполнялись. Подпись (HMAC на secret) не дает клиенту
+    самому продлить метку и перевести все свои чтения на primary.
+    """
+
+    def __init__(self,
+                 primary: AsyncEngine,
+                 replicas: list[AsyncEngine],
+                 sticky_seconds: float,
+                 secret: str):
+        self.primary: Engine = primary.sync_engine
+        self.replicas: list[Engine] = [replica.sync_engine for replica in replicas]
+        self.sticky_seconds = sticky_seconds
+        self._secret = secret.encode()
+        self._replica_cycle = itertools.cycle(self.replicas)
+
+    def _sign(self, until: str) -> str:
+        return hmac.new(self._secret, until.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def marker(self) -> str:
+        """Метка для клиента: время (unix), до которого его чтения идут на primary, и подпись"""
+        until = f"{time.time() + self.sticky_seconds:.3f}"
+        return f"{until}.{self._sign(until)}"
+
+    def parse_marker(self, marker: str | None) -> float:
+        """Время из метки клиента или 0, если метки нет или подпись не совпала"""
+        until, _, signature = (marker or "").rpartition(".")
+        if not until or not hmac.compare_digest(signature, self._sign(until)):
+            return 0.0
+        try:
+            return float(until)
+        except ValueError:
+            return 0.0
+
+    def note_write(self):
+        state = read_after_write.get()
+        if state is not None:
+            state.wrote = True
+            state.primary_until = time.time() + self.sticky_seconds
+
+    def is_sticky(self) -> bool:
+        state = read_after_write.get()
+        return state is not None and state.primary_until > time.time()
+
+    def replica(self) -> Engine:
+        return next(self._replica_cycle)
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая отправляет на реплику только чтения, помеченные REPLICA_BIND_ARGUMENTS.
+
+    Все остальное (запись, flush, запросы fastapi-users и т.д.) идет на primary. После
+    первой записи в сессии все ее чтения тоже идут на primary (read-your-writes в запросе).
+    Без роутера или реплик ведет себя как обычная Session.
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, replica: bool = False, **kw: Any):
+        router: ReplicaRouter | None = self.info.get(ROUTER_INFO_KEY)
+        if router is None or not router.replicas:
+            return super().get_bind(mapper, clause=clause, **kw)
+
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info["has_writes"] = True
+            router.note_write()
+            return router.primary
+
+        if replica and not self.info.get("has_writes") and not router.is_sticky():
+            return router.replica()
+        return router.primary
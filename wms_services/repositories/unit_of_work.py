@@ -0,0 +1,59 @@
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+__all__ = ["UnitOfWork"]
+
+
+class UnitOfWork:
+    """
+    Одна транзакция на несколько репозиториев в рамках запроса.
+
+    Пока открыт `async with uow:`, репозитории, созданные с этим uow, делают flush
+    вместо commit. Коммит один - при выходе из самого внешнего блока, при исключении
+    выполняется rollback. Вложенные блоки не коммитят, поэтому сервисы могут
+    вызывать друг друга.
+
+    Examples:
+    - async with uow:
+          await profile_repo.save(profile)
+          await wb_account_repo.insert(values)
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self._depth = 0
+        self._after_commit: list[Callable[[], None]] = []
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._depth > 0
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self._depth += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self._depth -= 1
+        if self._depth > 0:
+            return False
+
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.rollback()
+        return False
+
+    def on_commit(self, callback: Callable[[], None]):
+        """Вызвать callback после коммита текущей транзакции (например, сбросить кэш)"""
+        self._after_commit.append(callback)
+
+    async def commit(self):
+        await self.session.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    async def rollback(self):
+        await self.session.rollback()
+        self._after_commit = []
@@ -1,11 +1,17 @@
+from typing import Sequence
+
+from sqlalchemy import and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from wms_services.models import User
+from wms_services.models import User, ProfileModel, WBAccountModel
 from wms_services.repositories.base_repo import BaseDBRepository
 
 __all__ = ["UserDBRepository"]
 
 class UserDBRepository(BaseDBRepository[User]):
+    # Профили держат пользователя в загруженной связи user, удаление пользователя
+    # каскадно удаляет его профиль и кабинеты в БД
+    cache_invalidates = (ProfileModel, WBAccountModel)
 
     def __init__(self,
                  session: AsyncSession,
@@ -13,3 +19,32 @@ class UserDBRepository(BaseDBRepository[User]):
         super().__init__(User,
                          session,
                          *args, **kwargs)
+
+    async def existing_emails(self, emails: Sequence[str]) -> set[str]:
+        """Какие из email уже заняты (в нижнем регистре, как их сравнивает fastapi-users)"""
+        lowered = {email.lower() for email in emails}
+        if not lowered:
+            return set()
+        found = await self.get_where(many=True,
+                                     whereclause=func.lower(User.email).in_(lowered),
+                                     columns=[func.lower(User.email)])
+        return set(found)
+
+    @staticmethod
+    def list_filter(role: str | None = None,
+                    is_active: bool | None = None,
+                    email_prefix: str | None = None):
+        """Условие для списка пользователей (None - без фильтров).
+
+        Префикс email сравнивается без учета регистра и попадает в индекс ix_user_email_lower
+        """
+        clauses = []
+        if role is not None:
+            clauses.append(User.role == role)
+        if is_active is not None:
+            clauses.append(User.is_active == is_active)
+        if email_prefix:
+            escaped = email_prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append(func.lower(User.email).like(f"{escaped}%", escape="\\"))
+        return and_(*clauses) if clauses else None
+
@@ -1,6 +1,10 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from wms_services.models import WBAccountModel
+from wms_services.models.user_models import WBAccountStatus
 from wms_services.repositories.base_repo import BaseDBRepository
 
 __all__ = ["WBAccountsDBRepo"]
@@ -10,3 +14,52 @@ class WBAccountsDBRepo(BaseDBRepository[WBAccountModel]):
                  session: AsyncSession,
                  *args, **kwargs):
         super().__init__(WBAccountModel, session, *args, **kwargs)
+
+    async def revalidation_batch(self,
+                                 limit: int,
+                                 stale_before: datetime,
+                                 now: datetime,
+                                 retry_before: datetime | None = None) -> list[tuple]:
+        """
+        Кабинеты для фоновой перепроверки токена, по убыванию срочности:
+        активные с истекшим с последней проверки токеном, ни разу не проверенные, затем
+        проверенные раньше stale_before (сначала активные) - от самых давних. Кабинеты, проверка
+        которых завершилась ошибкой позже retry_before, пропускаются, чтобы не занимать начало
+        каждой пачки.
+
+        Каждая выборка идет по своему индексу (status + token_expires_at, частичный по
+        непроверенным, status + last_token_validate_at), без OR и сортировки всей таблицы.
+        :param limit: Размер пачки
+        :param stale_before: Кабинеты, проверенные позже, не считаются устаревшими
+        :param now: Текущее время (как в last_token_validate_at)
+        :param retry_before: Кабинеты с ошибкой проверки позже этого момента не выбираются
+        :return: (id, wb_token, due_at) - с какого момента кабинет ждет перепроверки
+        """
+        M = self.type_model
+        stale_for = now - stale_before
+        # (условие, порядок и момент, с которого кабинет ждет проверки, сдвиг этого момента)
+        queries = [
+            ((M.status == WBAccountStatus.ACTIVE.value) & (M.token_expires_at <= now)
+             & (M.last_token_validate_at < M.token_expires_at), M.token_expires_at, timedelta()),
+            (M.last_token_validate_at.is_(None), M.created_at, timedelta()),
+        ] + [
+            ((M.status == status.value) & (M.last_token_validate_at < stale_before),
+             M.last_token_validate_at, stale_for)
+            for status in (WBAccountStatus.ACTIVE, WBAccountStatus.INACTIVE)
+        ]
+
+        not_failed = None
+        if retry_before is not None:
+            not_failed = or_(M.token_validate_failed_at.is_(None), M.token_validate_failed_at < retry_before)
+
+        batch: dict = {}
+        for whereclause, order_by, due_shift in queries:
+            if len(batch) >= limit:
+                break
+            if not_failed is not None:
+                whereclause = whereclause & not_failed
+            rows = await self.get_where(many=True, whereclause=whereclause, order_by=order_by,
+                                        limit=limit - len(batch), columns=[M.id, M.wb_token, order_by])
+            for account_id, wb_token, due_at in rows:
+                batch.setdefault(account_id, (account_id, wb_token, due_at + due_shift))
+        return list(batch.values())
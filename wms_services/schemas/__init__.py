@@ -1,2 +1,4 @@
+from wms_services.schemas.pagination_schema import *
 from wms_services.schemas.profile_schemas import *
-from wms_services.schemas.wb_account_schema import *
\ No newline at end of file
+from wms_services.schemas.wb_account_schema import *
+from wms_services.schemas.user_import_schema import *
@@ -0,0 +1,14 @@
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel, Field
+
+__all__ = ["PageSchema"]
+
+ItemT = TypeVar("ItemT")
+
+
+class PageSchema(BaseModel, Generic[ItemT]):
+    items: list[ItemT]
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, None если страница последняя")
+    total: int | None = Field(None, description="Общее количество записей, если запрошено параметром `count`")
+    total_mode: str | None = Field(None, description="Способ подсчета `total`: exact, capped или estimated")
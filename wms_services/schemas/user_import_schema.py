@@ -0,0 +1,20 @@
+from pydantic import BaseModel, EmailStr, Field
+
+__all__ = ["UserImportRowSchema",
+           "UserImportResultSchema"]
+
+
+class UserImportRowSchema(BaseModel):
+    """Строка файла импорта пользователей (CSV/XLSX, заголовки - названия полей)"""
+    email: EmailStr
+    password: str = Field(min_length=1)
+    first_name: str = Field(min_length=1, max_length=100)
+    second_name: str = Field(min_length=1, max_length=100)
+    last_name: str = Field(min_length=1, max_length=100)  # Отчество
+    role: str = Field(default='Пользователь', min_length=1, max_length=100)
+
+
+class UserImportResultSchema(BaseModel):
+    created: int
+    # Email, которые уже заняты: такие строки пропускаются, импорт можно повторять
+    skipped_existing: list[str]
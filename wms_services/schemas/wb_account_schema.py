@@ -7,7 +7,13 @@ from pydantic import BaseModel, ConfigDict, Field
 __all__ = ["BaseWBAccountSchema",
            "CreateWBAccountSchema",
            "UpdateWBAccountSchema",
-           "ResponseWBAccountSchema"]
+           "ImportWBAccountSchema",
+           "ResponseWBAccountSchema",
+           "SearchWBAccountSchema",
+           "ValidateWBAccountsSchema",
+           "WBAccountValidationResultSchema",
+           "WBAccountsValidationSummarySchema",
+           "WBAccountsValidationProgressSchema"]
 
 
 class BaseWBAccountSchema(BaseModel):
@@ -24,6 +30,10 @@ class UpdateWBAccountSchema(BaseWBAccountSchema):
     wb_token: str | None = None
 
 
+class ImportWBAccountSchema(BaseWBAccountSchema):
+    id: uuid.UUID | None = Field(None, description="ID существующего кабинета профиля, который нужно обновить")
+
+
 class ResponseWBAccountSchema(BaseWBAccountSchema):
     model_config = ConfigDict(from_attributes=True)
 
@@ -35,3 +45,43 @@ class ResponseWBAccountSchema(BaseWBAccountSchema):
     status: int
     last_token_validate_at: datetime.datetime | None = None
     last_cards_sync_at: datetime.datetime | None = None
+
+
+class SearchWBAccountSchema(BaseModel):
+    """Фильтры поиска кабинетов, все указанные условия объединяются через И"""
+    token_metadata_contains: dict | None = Field(None, description='Мета-данные токена содержат объект, '
+                                                                   'например {"scopes": ["content"]}')
+    token_metadata_not_contains: dict | None = Field(None, description="Мета-данные токена не содержат объект")
+    token_metadata_path: str | None = Field(None, description="В мета-данных токена есть элемент по JSONPath, "
+                                                              'например $.scopes[*] ? (@ == "content")')
+    details_contains: dict | None = Field(None, description="Мета-данные кабинета содержат объект")
+    details_path: str | None = Field(None, description="В мета-данных кабинета есть элемент по JSONPath, "
+                                                       "например $.warehouse_id")
+    status: int | None = Field(None, description="Статус кабинета")
+
+
+class ValidateWBAccountsSchema(BaseModel):
+    account_ids: list[uuid.UUID] | None = Field(None, description="ID кабинетов для проверки, "
+                                                                  "по умолчанию все кабинеты профиля")
+
+
+class WBAccountValidationResultSchema(BaseModel):
+    account_id: uuid.UUID
+    status: int | None = Field(None, description="Новый статус кабинета, пусто при ошибке проверки")
+    error: str | None = Field(None, description="Почему проверка не выполнена (например, ВБ не ответил на ping)")
+
+
+class WBAccountsValidationSummarySchema(BaseModel):
+    total: int
+    active: int
+    inactive: int
+    failed: int = Field(..., description="Проверка не выполнена (в т.ч. ВБ не ответил), статус кабинета не изменен")
+    seconds: float
+
+
+class WBAccountsValidationProgressSchema(BaseModel):
+    """Строка потока массовой проверки: результат очередного кабинета или итог в последней строке"""
+    done: int
+    total: int
+    result: WBAccountValidationResultSchema | None = None
+    summary: WBAccountsValidationSummarySchema | None = None
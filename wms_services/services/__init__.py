@@ -1,3 +1,4 @@
 from wms_services.services.profile_service import *
 from wms_services.services.wb_accounts_service import *
 
+from wms_services.services.user_import_service import *
@@ -1,4 +1,19 @@
+from contextlib import nullcontext
+
+from wms_services.repositories.unit_of_work import UnitOfWork
+
+
 class BaseService:
     def __init__(self,
+                 uow: UnitOfWork | None = None,
                  *args, **kwargs):
-        pass
+        self.uow = uow
+
+    def transaction(self):
+        """
+        Транзакция на весь вызов сервиса: репозитории внутри делают flush, коммит один в конце.
+        Без unit of work каждый метод репозитория коммитит сам, как раньше.
+        """
+        if self.uow is None:
+            return nullcontext()
+        return self.uow
@@ -1,9 +1,11 @@
 import uuid
-from typing import Optional, Sequence
+from typing import Optional, Sequence, AsyncIterator
 
 from loguru import logger
 
 from wms_services.models import ProfileModel
+from wms_services.repositories.loaders import PROFILE_WITH_USER
+from wms_services.repositories.pagination import CountMode
 from wms_services.repositories.profile_repo import ProfileDBRepository
 from wms_services.schemas import ProfileRequestSchema
 from wms_services.services.base_service import BaseService
@@ -21,13 +23,15 @@ class ProfileService(BaseService):
     async def get_by_id(
             self,
             profile_id: uuid.UUID | None = None,
-            user_id: uuid.UUID | None = None
+            user_id: uuid.UUID | None = None,
+            fields: Sequence[str] | None = None,
     ) -> ProfileModel | None:
         """
         Получает профиль по ID профиля или пользователя.
         Оба параметра не могут быть использованы одновременно
         :param profile_id: ID профиля
         :param user_id: ID пользователя
+        :param fields: Загружаемые поля профиля, по умолчанию все (через кэш сущностей)
         :return: модель профиля
         """
 
@@ -38,12 +42,14 @@ class ProfileService(BaseService):
         try:
             result = None
 
-            if profile_id is not None:
-                result = await self.profile_repo.get_where(many=False,
-                                                           whereclause=ProfileModel.id == profile_id)
+            if fields is not None and (profile_id is not None or user_id is not None):
+                whereclause = (ProfileModel.id == profile_id if profile_id is not None
+                               else ProfileModel.user_id == user_id)
+                result = await self.profile_repo.get_where(whereclause=whereclause, fields=fields)
+            elif profile_id is not None:
+                result = await self.profile_repo.get_by("id", profile_id, loader=PROFILE_WITH_USER)
             elif user_id is not None:
-                result = await self.profile_repo.get_where(many=False,
-                                                           whereclause=ProfileModel.user_id == user_id)
+                result = await self.profile_repo.get_by("user_id", user_id, loader=PROFILE_WITH_USER)
 
             return result
 
@@ -53,11 +59,52 @@ class ProfileService(BaseService):
 
     async def get_all_profiles(self) -> Sequence[ProfileModel]:
         try:
-            return await self.profile_repo.get_where(many=True)
+            return await self.profile_repo.get_where(many=True, loader=PROFILE_WITH_USER)
         except Exception as e:
             logger.error(f"ошибка получения списка профилей: {e}")
             raise
 
+    async def get_profiles_page(
+            self,
+            limit: int,
+            cursor: str | None = None,
+            fields: Sequence[str] | None = None,
+    ) -> tuple[Sequence[ProfileModel], str | None]:
+        """
+        Страница списка профилей (keyset-пагинация).
+        :param limit: Количество профилей на странице
+        :param cursor: Курсор следующей страницы из предыдущего ответа
+        :param fields: Загружаемые поля профиля, по умолчанию все
+        :return: Профили страницы и курсор следующей страницы
+        """
+        try:
+            return await self.profile_repo.get_page(limit=limit, cursor=cursor, fields=fields,
+                                                    loader=None if fields is not None else PROFILE_WITH_USER)
+        except Exception as e:
+            logger.error(f"ошибка получения списка профилей: {e}")
+            raise
+
+    async def count_profiles(self, mode: CountMode = CountMode.EXACT) -> int:
+        """
+        Общее количество профилей для списка.
+        :param mode: Способ подсчета (точный, с пределом или оценка)
+        :return: Количество профилей
+        """
+        return await self.profile_repo.count(mode=mode)
+
+    async def stream_profiles(self) -> AsyncIterator[ProfileModel]:
+        """
+        Потоковая выгрузка всех профилей без загрузки всего списка в память.
+        :return: Асинхронный итератор по профилям в порядке создания
+        """
+        try:
+            async for profile in self.profile_repo.stream_where(order_by=ProfileModel.created_at,
+                                                                loader=PROFILE_WITH_USER):
+                yield profile
+        except Exception as e:
+            logger.error(f"ошибка выгрузки списка профилей: {e}")
+            raise
+
     # async def add_tokens(
     #         self,
     #         profile_id: uuid.UUID,
@@ -87,38 +134,64 @@ class ProfileService(BaseService):
     async def create_profile(self, profile: ProfileRequestSchema) -> ProfileModel:
         try:
             profile = ProfileModel(**profile.model_dump())
-            return await self.profile_repo.save(profile)
+            async with self.transaction():
+                return await self.profile_repo.save(profile, loader=PROFILE_WITH_USER)
         except Exception as e:
             logger.error(f"Ошибка создания профиля: {e}")
             raise
 
+    async def import_profiles(self, profiles: Sequence[ProfileRequestSchema]) -> Sequence[ProfileModel]:
+        """
+        Массовое создание профилей. Для пользователей, у которых профиль уже есть,
+        возвращается существующий профиль.
+        :param profiles: Профили для создания
+        :return: Профили вместе с пользователями
+        """
+        try:
+            # Повторяющийся user_id в одной пачке ON CONFLICT не пропустит
+            values = list({profile.user_id: profile.model_dump() for profile in profiles}.values())
+            async with self.transaction():
+                saved = await self.profile_repo.bulk_upsert(values, index_elements=["user_id"])
+            if not saved:
+                return []
+
+            # Пользователи не приходят из RETURNING, догружаем одним запросом
+            return await self.profile_repo.get_where(many=True,
+                                                     whereclause=ProfileModel.id.in_([p.id for p in saved]),
+                                                     loader=PROFILE_WITH_USER)
+        except Exception as e:
+            logger.error(f"Ошибка импорта профилей: {e}")
+            raise
+
     async def update_profile(self,
                              profile_id: uuid.UUID,
                              updated_data: dict) -> Optional[ProfileModel]:
         try:
-            profile = await self.profile_repo.get(profile_id)
+            async with self.transaction():
+                profile = await self.profile_repo.get(profile_id, loader=PROFILE_WITH_USER)
 
-            if profile is None:
-                return None
+                if profile is None:
+                    return None
 
-            for key, value in updated_data.items():
-                if hasattr(profile, key):
-                    setattr(profile, key, value)
+                # Если сменился пользователь, загруженный вместе с профилем user устареет
+                user_changed = updated_data.get("user_id", profile.user_id) != profile.user_id
 
-            return await self.profile_repo.save(profile)
+                for key, value in updated_data.items():
+                    if hasattr(profile, key):
+                        setattr(profile, key, value)
+
+                # updated_at приходит из RETURNING при flush, отдельный refresh нужен только для смены user
+                return await self.profile_repo.save(profile, refresh=user_changed, loader=PROFILE_WITH_USER)
         except Exception as e:
             logger.error(f"Ошибка обновления профиля: {e}")
             raise
 
     async def delete_profile(self, profile_id: uuid.UUID) -> bool:
         try:
-            profile = await self.profile_repo.get(profile_id)
-
-            if profile is None:
-                return False
-
-            await self.profile_repo.delete(profile)
-            return True
+            # Кабинеты профиля удаляются каскадом внешнего ключа, без загрузки в сессию
+            async with self.transaction():
+                deleted = await self.profile_repo.delete_by_ids([profile_id])
+            return bool(deleted)
         except Exception as e:
             logger.error(f"Ошибка удаления профиля: {e}")
             raise
@@ -0,0 +1,102 @@
+from typing import Any, Awaitable, Callable, Sequence
+
+from loguru import logger
+from pydantic import ValidationError
+
+from wms_services.exceptions.user_exceptions import UserImportError
+from wms_services.repositories.profile_repo import ProfileDBRepository
+from wms_services.repositories.user_repo import UserDBRepository
+from wms_services.schemas import UserImportRowSchema, UserImportResultSchema
+from wms_services.services.base_service import BaseService
+from wms_services.utils.uuid7 import uuid7
+
+__all__ = ["UserImportService"]
+
+# Хеширует пароли пачкой (порядок результатов - порядок паролей)
+PasswordsHasher = Callable[[Sequence[str]], Awaitable[Sequence[str]]]
+
+
+class UserImportService(BaseService):
+    def __init__(self,
+                 user_repo: UserDBRepository,
+                 profile_repo: ProfileDBRepository,
+                 *args, **kwargs):
+        self.user_repo = user_repo
+        self.profile_repo = profile_repo
+
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def validate_rows(rows: Sequence[tuple[int, dict[str, str]]]) -> list[UserImportRowSchema]:
+        """
+        Проверка строк файла целиком: ошибки собираются по всем строкам сразу.
+        :raises UserImportError: есть некорректные строки или повторяющиеся email
+        """
+        valid, errors, seen = [], [], {}
+        for number, row in rows:
+            try:
+                user = UserImportRowSchema.model_validate(row)
+            except ValidationError as e:
+                errors.extend({"row": number, "field": ".".join(map(str, error["loc"])), "error": error["msg"]}
+                              for error in e.errors())
+                continue
+
+            email = user.email.lower()
+            if email in seen:
+                errors.append({"row": number, "field": "email", "error": f"Email повторяет строку {seen[email]}"})
+                continue
+            seen[email] = number
+            valid.append(user)
+
+        if errors:
+            raise UserImportError(errors)
+        return valid
+
+    async def import_users(self,
+                           rows: Sequence[tuple[int, dict[str, str]]],
+                           hash_passwords: PasswordsHasher) -> UserImportResultSchema:
+        """
+        Массовое создание пользователей с профилями.
+
+        Пароли хешируются до начала транзакции (параллельно, через hash_passwords), затем
+        пользователи и их профили вставляются через COPY в одной транзакции: либо создаются все,
+        либо никто. Пользователи с уже занятыми email пропускаются. Хуки регистрации
+        fastapi-users (on_after_register) не вызываются: профиль создается здесь же.
+        :param rows: Строки файла с номерами (см. wms_services.utils.read_table)
+        :param hash_passwords: Хеширование паролей пачкой
+        :return: Сколько пользователей создано и какие email пропущены
+        :raises UserImportError: файл содержит некорректные строки
+        """
+        users = self.validate_rows(rows)
+        try:
+            existing = await self.user_repo.existing_emails([user.email for user in users])
+            users = [user for user in users if user.email.lower() not in existing]
+            hashed_passwords = await hash_passwords([user.password for user in users])
+
+            user_values: list[dict[str, Any]] = []
+            profile_values: list[dict[str, Any]] = []
+            for user, hashed_password in zip(users, hashed_passwords):
+                user_id = uuid7()
+                user_values.append({
+                    "id": user_id,
+                    "email": user.email,
+                    "hashed_password": hashed_password,
+                    "is_active": True,
+                    "is_superuser": False,
+                    "is_verified": False,
+                    "first_name": user.first_name,
+                    "second_name": user.second_name,
+                    "last_name": user.last_name,
+                    "role": user.role,
+                })
+                profile_values.append({"id": uuid7(), "user_id": user_id})
+
+            async with self.transaction():
+                created = await self.user_repo.copy_insert(user_values)
+                await self.profile_repo.copy_insert(profile_values)
+        except Exception as e:
+            logger.error(f"Ошибка импорта пользователей: {e}")
+            raise
+
+        logger.info(f"Imported {created} users with profiles, {len(existing)} existing emails skipped.")
+        return UserImportResultSchema(created=created, skipped_existing=sorted(existing))
@@ -1,19 +1,41 @@
+import asyncio
+import random
+import time
 import uuid
 from datetime import datetime
-from typing import Optional, Sequence
+from typing import Optional, Sequence, AsyncIterator, Any
 
+import httpx
 from loguru import logger
+from sqlalchemy import and_
+from sqlalchemy.exc import DataError, ProgrammingError
 # from marketplace_client.utils.jwt import InvalidTokenError, decode_token
 # from marketplace_client.wildberries import WildberriesMarketplaceClient
 # from marketplace_client.wildberries.client import WildberriesBaseClient
 
-from wms_services.exceptions.accounts_exceptions import WbAccountInactiveError, WbAccountNotFoundError
-from wms_services.models import WBAccountModel, ProfileModel
+from wms_services.exceptions.accounts_exceptions import (
+    WbAccountInactiveError,
+    WbAccountNotFoundError,
+    WbAccountSearchError,
+    WbTokenCheckError,
+)
+from wms_services.models import WBAccountModel
 from wms_services.models.user_models import WBAccountStatus
+from wms_services.repositories.cache import TokenMetadataCache
+from wms_services.repositories.loaders import ACCOUNT_LIST
+from wms_services.repositories.pagination import CountMode
 from wms_services.repositories.profile_repo import ProfileDBRepository
 from wms_services.repositories.wb_accounts_repo import WBAccountsDBRepo
-from wms_services.schemas import CreateWBAccountSchema, UpdateWBAccountSchema
+from wms_services.schemas import (
+    CreateWBAccountSchema,
+    UpdateWBAccountSchema,
+    ImportWBAccountSchema,
+    SearchWBAccountSchema,
+)
 from wms_services.services.base_service import BaseService
+from wms_services.utils.http_pool import HTTPClientPool
+from wms_services.utils.jwt_claims import token_expires_at
+from wms_services.utils.uuid7 import uuid7
 
 __all__ = ["WBAccountsService"]
 
@@ -21,9 +43,14 @@ class WBAccountsService(BaseService):
     def __init__(self,
                  wb_account_repo: WBAccountsDBRepo,
                  profile_repo: ProfileDBRepository,
-                 *args, **kwargs):
+                 *args,
+                 token_cache: TokenMetadataCache | None = None,
+                 http_pool: HTTPClientPool | None = None,
+                 **kwargs):
         self.wb_account_repo = wb_account_repo
         self.profile_repo = profile_repo
+        self.token_cache = token_cache
+        self.http_pool = http_pool
         super().__init__(*args, **kwargs)
 
     async def add_account(
@@ -38,28 +65,70 @@ class WBAccountsService(BaseService):
         :return:
         """
         try:
-            profile = await self.profile_repo.get_where(many=False, whereclause=ProfileModel.id == profile_id)
-            if profile is None:
-                logger.error(f"Profile with ID {profile_id} not found.")
-                return None
-
-            # Создание неактивного кабинета
-            new_account = WBAccountModel(
-                profile_id=profile_id,
-                **account_create_data.model_dump(),
-            )
-            new_account = await self.wb_account_repo.save(new_account)
-
-            account, _ = await self.check_account_token(new_account, account_create_data.wb_token)
-            return account
+            # Токен проверяется до вставки, чтобы кабинет сразу записался с итоговым статусом,
+            # и до начала транзакции, чтобы не держать ее открытой на время запроса к ВБ
+            token_values, _ = await self.validate_account_token(account_create_data.wb_token)
+
+            async with self.transaction():
+                profile = await self.profile_repo.get_by("id", profile_id)
+                if profile is None:
+                    logger.error(f"Profile with ID {profile_id} not found.")
+                    return None
+
+                return await self.wb_account_repo.insert({
+                    "profile_id": profile_id,
+                    **account_create_data.model_dump(),
+                    **token_values,
+                })
         except Exception as e:
             logger.error(f"Error adding WB account: {e}")
             raise
 
+    async def import_accounts(
+            self,
+            profile_id: uuid.UUID,
+            accounts: Sequence[ImportWBAccountSchema],
+    ) -> Sequence[WBAccountModel]:
+        """
+        Массовый импорт кабинетов ВБ в профиль.
+
+        Кабинеты без ID создаются, кабинеты с ID профиля обновляются. Кабинеты других
+        профилей не изменяются и не попадают в результат. Токены не проверяются,
+        импортированные кабинеты получают статус NOT_CHECKED и сброшенные результаты прошлой
+        проверки, поэтому попадают в фоновую перепроверку как ни разу не проверенные.
+        :param profile_id: ID профиля, к которому привязываются кабинеты
+        :param accounts: Кабинеты для импорта
+        :return: Сохраненные кабинеты
+        """
+        try:
+            values = {}
+            for account in accounts:
+                account_id = account.id or uuid7()
+                # Повторяющийся ID в одной пачке ON CONFLICT не пропустит, побеждает последний
+                values[account_id] = {
+                    **account.model_dump(exclude={"id"}),
+                    "id": account_id,
+                    "profile_id": profile_id,
+                    "status": WBAccountStatus.NOT_CHECKED.value,
+                    "token_metadata": None,
+                    "last_token_validate_at": None,
+                    "token_expires_at": None,
+                    "token_validate_failed_at": None,
+                }
+            async with self.transaction():
+                return await self.wb_account_repo.bulk_upsert(
+                    list(values.values()),
+                    conflict_where=WBAccountModel.profile_id == profile_id,
+                )
+        except Exception as e:
+            logger.error(f"Error importing WB accounts: {e}")
+            raise
+
     async def get_accounts_by_id(
             self,
             profile_id: Optional[uuid.UUID] = None,
             account_id: Optional[uuid.UUID] = None,
+            fields: Optional[Sequence[str]] = None,
     ) -> Optional[Sequence[WBAccountModel] | WBAccountModel]:
         """
         Получение списка личных кабинетов для указанного профиля или кабинета.
@@ -69,6 +138,7 @@ class WBAccountsService(BaseService):
         Если указан профиль, то вернутся последовательность объектов
         :param account_id:
         :param profile_id: ID профиля
+        :param fields: Загружаемые поля кабинета, по умолчанию все
         :return: Список всех личных кабинетов для профиля
         """
 
@@ -82,12 +152,16 @@ class WBAccountsService(BaseService):
 
         try:
             accounts = []
-            if profile_id:
+            if profile_id and fields is not None:
                 accounts = await self.wb_account_repo.get_where(many=True,
-                                                                whereclause=WBAccountModel.profile_id == profile_id)
+                                                                whereclause=WBAccountModel.profile_id == profile_id,
+                                                                fields=fields)
+            elif profile_id:
+                accounts = await self.wb_account_repo.get_by("profile_id", profile_id, many=True,
+                                                             loader=ACCOUNT_LIST)
 
             if account_id:
-                accounts = await self.get_by_id(account_id)
+                accounts = await self.get_by_id(account_id, fields=fields)
 
             return accounts
         except Exception as e:
@@ -95,7 +169,85 @@ class WBAccountsService(BaseService):
             raise
 
     async def get_all(self) -> Optional[Sequence[WBAccountModel] | WBAccountModel]:
-        return await self.wb_account_repo.get_where(many=True)
+        return await self.wb_account_repo.get_where(many=True, loader=ACCOUNT_LIST)
+
+    async def get_page(
+            self,
+            limit: int,
+            cursor: str | None = None,
+            fields: Optional[Sequence[str]] = None,
+    ) -> tuple[Sequence[WBAccountModel], str | None]:
+        """
+        Страница списка всех кабинетов (keyset-пагинация).
+        :param limit: Количество кабинетов на странице
+        :param cursor: Курсор следующей страницы из предыдущего ответа
+        :param fields: Загружаемые поля кабинета, по умолчанию все
+        :return: Кабинеты страницы и курсор следующей страницы
+        """
+        return await self.wb_account_repo.get_page(limit=limit, cursor=cursor, fields=fields,
+                                                   loader=None if fields is not None else ACCOUNT_LIST)
+
+    async def search_accounts(
+            self,
+            query: SearchWBAccountSchema,
+            limit: int,
+            cursor: str | None = None,
+            profile_id: Optional[uuid.UUID] = None,
+    ) -> tuple[Sequence[WBAccountModel], str | None]:
+        """
+        Поиск кабинетов по мета-данным токена и кабинета (keyset-пагинация).
+
+        Условия по JSON выполняются в БД через GIN-индексы, кабинеты не фильтруются в Python.
+        :param query: Фильтры поиска
+        :param limit: Количество кабинетов на странице
+        :param cursor: Курсор следующей страницы из предыдущего ответа
+        :param profile_id: Если указан, ищутся только кабинеты этого профиля
+        :return: Кабинеты страницы и курсор следующей страницы
+        :raises WbAccountSearchError: если JSONPath некорректен
+        """
+        repo = self.wb_account_repo
+        clauses = []
+        if profile_id is not None:
+            clauses.append(WBAccountModel.profile_id == profile_id)
+        if query.status is not None:
+            clauses.append(WBAccountModel.status == query.status)
+        if query.token_metadata_contains is not None:
+            clauses.append(repo.json_contains("token_metadata", query.token_metadata_contains))
+        if query.token_metadata_not_contains is not None:
+            # Отрицание не использует индекс, но отбирает только среди уже найденных по остальным условиям
+            clauses.append(~repo.json_contains("token_metadata", query.token_metadata_not_contains))
+        if query.token_metadata_path is not None:
+            clauses.append(repo.json_path_exists("token_metadata", query.token_metadata_path))
+        if query.details_contains is not None:
+            clauses.append(repo.json_contains("details", query.details_contains))
+        if query.details_path is not None:
+            clauses.append(repo.json_path_exists("details", query.details_path))
+
+        try:
+            return await repo.get_page(limit=limit, cursor=cursor,
+                                       whereclause=and_(*clauses) if clauses else None,
+                                       loader=ACCOUNT_LIST)
+        except (DataError, ProgrammingError) as e:
+            # Синтаксис JSONPath проверяет сама БД при приведении к типу jsonpath
+            logger.error(f"Error searching WB accounts: {e}")
+            raise WbAccountSearchError
+
+    async def count_accounts(self, mode: CountMode = CountMode.EXACT) -> int:
+        """
+        Общее количество кабинетов для списка.
+        :param mode: Способ подсчета (точный, с пределом или оценка)
+        :return: Количество кабинетов
+        """
+        return await self.wb_account_repo.count(mode=mode)
+
+    async def stream_all(self) -> AsyncIterator[WBAccountModel]:
+        """
+        Потоковая выгрузка всех кабинетов без загрузки всего списка в память.
+        :return: Асинхронный итератор по кабинетам в порядке создания
+        """
+        async for account in self.wb_account_repo.stream_where(order_by=WBAccountModel.created_at,
+                                                               loader=ACCOUNT_LIST):
+            yield account
 
     async def update_token(
             self,
@@ -109,12 +261,11 @@ class WBAccountsService(BaseService):
         :return: Обновленный аккаунт
         """
         try:
-            account = await self.wb_account_repo.get(account_id)
+            token_values, _ = await self.validate_account_token(new_wb_token)
+            async with self.transaction():
+                account = await self.wb_account_repo.update_one(account_id, token_values)
             if account is None:
                 logger.error(f"WB account with ID {account_id} not found.")
-                return None
-            account.wb_token = new_wb_token
-            account, _ = await self.check_account_token(account, new_wb_token)
             return account
         except Exception as e:
             logger.error(f"Error updating WB account token: {e}")
@@ -130,26 +281,97 @@ class WBAccountsService(BaseService):
         :return: True, если удаление прошло успешно, иначе False
         """
         try:
-            account = await self.wb_account_repo.get(account_id)
-            if account is None:
+            async with self.transaction():
+                deleted = await self.wb_account_repo.delete_by_ids([account_id])
+            if not deleted:
                 logger.error(f"WB account with ID {account_id} not found.")
                 return False
-
-            await self.wb_account_repo.delete(account)
             return True
         except Exception as e:
             logger.error(f"Error deleting WB account: {e}")
             raise
 
-    async def check_account_token(
+    async def delete_accounts(
+            self,
+            account_ids: Sequence[uuid.UUID],
+            profile_id: Optional[uuid.UUID] = None,
+    ) -> Sequence[uuid.UUID]:
+        """
+        Массовое удаление личных кабинетов одним запросом.
+        :param account_ids: ID кабинетов для удаления
+        :param profile_id: Если указан, удаляются только кабинеты этого профиля
+        :return: ID удаленных кабинетов
+        """
+        try:
+            whereclause = WBAccountModel.profile_id == profile_id if profile_id is not None else None
+            async with self.transaction():
+                return await self.wb_account_repo.delete_by_ids(list(set(account_ids)), whereclause=whereclause)
+        except Exception as e:
+            logger.error(f"Error deleting WB accounts: {e}")
+            raise
+
+    async def validate_account_token(
         self,
-        account: WBAccountModel,
         wb_token: str,
-    ) -> (WBAccountModel, bool):
-        token_metadata = None
+    ) -> (dict, bool):
+        """
+        Проверяет токен и возвращает значения колонок кабинета по результату проверки.
+
+        В БД ничего не пишет: значения передаются в insert/update_one репозитория,
+        чтобы результат проверки сохранялся одним запросом.
+        :param wb_token: Токен кабинета
+        :return: Значения колонок (wb_token, token_metadata, status, last_token_validate_at, token_expires_at,
+                 token_validate_failed_at)
+                 и признак активности токена
+        :raises WbTokenCheckError: если ВБ не ответил на ping (сеть, таймаут, 5xx)
+        """
         is_active = False
-        token_is_valid = False
+        token_is_valid, token_metadata, expires_at = self.parse_token(wb_token)
+        if token_is_valid:
+            # Через общий пул соединений приложения, если он запущен, иначе - отдельный клиент
+            if self.http_pool is not None and self.http_pool.is_running:
+                client = self.http_pool.for_token(wb_token)
+            else:
+                client = WildberriesMarketplaceClient(token=wb_token)
 
+            # Проверка что токен действительный на данный момент. False - ВБ отклонил токен,
+            # ошибка запроса ничего не говорит о токене, и статус кабинета по ней не меняется
+            try:
+                ping_result = await client.common_ping()
+            except httpx.HTTPStatusError as e:
+                raise WbTokenCheckError(f"ВБ ответил {e.response.status_code}") from e
+            except Exception as e:
+                raise WbTokenCheckError(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__) from e
+
+            if ping_result:
+                is_active = True
+
+        values = {
+            "wb_token": wb_token,
+            "token_metadata": token_metadata,
+            "status": WBAccountStatus.ACTIVE.value if is_active else WBAccountStatus.INACTIVE.value,
+            "last_token_validate_at": datetime.now(),
+            "token_expires_at": expires_at,
+            "token_validate_failed_at": None,
+        }
+        return values, is_active
+
+    def parse_token(self, wb_token: str) -> tuple[bool, dict | None, datetime | None]:
+        """
+        Проверки токена без сети: декодирование и доступы к нужным разделам.
+
+        Результат зависит только от токена, поэтому берется из token_cache, если он задан:
+        при повторных проверках того же токена заново выполняется только ping.
+        :return: Корректен ли токен, мета-данные токена (JSON) и срок действия
+        """
+        if self.token_cache is not None:
+            cached = self.token_cache.get_token(wb_token)
+            if cached is not None:
+                return cached
+
+        token_metadata = None
+        expires_at = None
+        token_is_valid = False
         try:
             # Проверка что токен впринципе корректный
             decode_token(wb_token)
@@ -158,35 +380,173 @@ class WBAccountsService(BaseService):
             pass
         if token_is_valid:
             # Проверка что токен имеет доступ к нужным разделам
-            token_metadata = WildberriesBaseClient.validate_token(wb_token)
-            client = WildberriesMarketplaceClient(token=wb_token)
-            
-            # Проверка что токен действительный на данный момент
-            try:
-                ping_result = await client.common_ping()
-            except Exception as e:
-                ping_result = False
+            token_metadata = WildberriesBaseClient.validate_token(wb_token).model_dump(mode="json")
+            expires_at = token_expires_at(wb_token)
 
-            if ping_result:
-                account.token_metadata = token_metadata.model_dump(mode="json")
-                await self.wb_account_repo.save(account)
-                is_active = True
+        parsed = token_is_valid, token_metadata, expires_at
+        if self.token_cache is not None:
+            self.token_cache.set_token(wb_token, parsed,
+                                       expires_at=expires_at.timestamp() if expires_at is not None else None)
+        return parsed
 
-        account.token_metadata = token_metadata.model_dump(mode="json") if token_metadata is not None else None
+    async def validate_accounts(
+            self,
+            account_ids: Optional[Sequence[uuid.UUID]] = None,
+            profile_id: Optional[uuid.UUID] = None,
+            concurrency: int = 10,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Массовая проверка токенов кабинетов с прогрессом.
 
-        if is_active:
-            account.status = WBAccountStatus.ACTIVE.value
-        else:
-            account.status = WBAccountStatus.INACTIVE.value
-        account.last_token_validate_at = datetime.now()
-        return await self.wb_account_repo.save(account), is_active
+        Кабинеты проверяются параллельно (не больше concurrency одновременно), результат каждого
+        отдается по мере готовности. Новые статусы записываются в конце одним пакетным UPDATE,
+        поэтому транзакция не держится открытой на время запросов к ВБ. Если итератор не дочитали
+        (клиент отключился), проверки отменяются и ничего не записывается.
+        :param account_ids: ID кабинетов, по умолчанию все кабинеты (профиля)
+        :param profile_id: Если указан, проверяются только кабинеты этого профиля
+        :param concurrency: Сколько кабинетов проверяется одновременно
+        :return: Асинхронный итератор строк прогресса (см. WBAccountsValidationProgressSchema):
+                 по одной на кабинет и итоговая
+        """
+        clauses = []
+        if account_ids is not None:
+            clauses.append(WBAccountModel.id.in_(set(account_ids)))
+        if profile_id is not None:
+            clauses.append(WBAccountModel.profile_id == profile_id)
+        accounts = await self.wb_account_repo.get_where(many=True,
+                                                        whereclause=and_(*clauses) if clauses else None,
+                                                        columns=[WBAccountModel.id, WBAccountModel.wb_token])
+
+        async for progress in self._validate_tokens(accounts, concurrency):
+            yield progress
+
+    async def revalidate_stale(
+            self,
+            limit: int,
+            stale_before: datetime,
+            concurrency: int = 10,
+            jitter: float = 0,
+            retry_before: Optional[datetime] = None,
+    ) -> dict[str, Any]:
+        """
+        Фоновая перепроверка пачки кабинетов (см. WBAccountsDBRepo.revalidation_batch)
+        :param limit: Размер пачки
+        :param stale_before: Кабинеты, проверенные позже, не перепроверяются
+        :param concurrency: Сколько кабинетов проверяется одновременно
+        :param jitter: Случайная задержка перед проверкой кабинета (0..jitter секунд),
+                       чтобы пачка не уходила в ВБ одним всплеском
+        :param retry_before: Кабинеты, проверка которых завершилась ошибкой позже, пропускаются
+        :return: Итог пачки (см. WBAccountsValidationSummarySchema) и lag_seconds - сколько
+                 самый давний кабинет пачки ждал перепроверки сверх срока
+        """
+        now = datetime.now()
+        batch = await self.wb_account_repo.revalidation_batch(limit, stale_before=stale_before, now=now,
+                                                              retry_before=retry_before)
+        summary = None
+        async for progress in self._validate_tokens([(account_id, wb_token) for account_id, wb_token, _ in batch],
+                                                    concurrency, jitter):
+            summary = progress.get("summary")
+        lag = max(((now - due_at).total_seconds() for _, _, due_at in batch), default=0.0)
+        return {**summary, "lag_seconds": max(lag, 0.0)}
+
+    async def _validate_tokens(
+            self,
+            accounts: Sequence[tuple[uuid.UUID, str]],
+            concurrency: int,
+            jitter: float = 0,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Параллельная проверка (id, wb_token) с прогрессом и записью статусов пакетным UPDATE в конце.
+        У кабинетов, проверка которых завершилась ошибкой, статус не меняется, записывается только
+        время ошибки (token_validate_failed_at), по которому фоновая перепроверка их откладывает
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def validate(account_id: uuid.UUID, wb_token: str) -> tuple[uuid.UUID, dict | None, str | None]:
+            if jitter:
+                await asyncio.sleep(random.uniform(0, jitter))
+            async with semaphore:
+                try:
+                    values, _ = await self.validate_account_token(wb_token)
+                # Ошибка запроса к ВБ (WbTokenCheckError) попадает в error строки и в failed итога,
+                # а не в неактивные кабинеты
+                except Exception as e:
+                    logger.error(f"Error validating WB account {account_id} token: {e}")
+                    return account_id, None, str(e)
+            return account_id, values, None
+
+        started = time.perf_counter()
+        total, done, active, failed = len(accounts), 0, 0, 0
+        updates, failures = [], []
+        tasks = [asyncio.create_task(validate(account_id, wb_token)) for account_id, wb_token in accounts]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                account_id, values, error = await next_result
+                done += 1
+                if values is None:
+                    failed += 1
+                    failures.append({"id": account_id, "token_validate_failed_at": datetime.now()})
+                else:
+                    updates.append({
+                        "id": account_id,
+                        "token_metadata": values["token_metadata"],
+                        "status": values["status"],
+                        "last_token_validate_at": values["last_token_validate_at"],
+                        "token_expires_at": values["token_expires_at"],
+                        "token_validate_failed_at": None,
+                    })
+                    active += values["status"] == WBAccountStatus.ACTIVE.value
+                yield {
+                    "done": done,
+                    "total": total,
+                    "result": {
+                        "account_id": account_id,
+                        "status": values["status"] if values is not None else None,
+                        "error": error,
+                    },
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        async with self.transaction():
+            await self.wb_account_repo.bulk_update(updates)
+            await self.wb_account_repo.bulk_update(failures)
+
+        yield {
+            "done": done,
+            "total": total,
+            "summary": {
+                "total": total,
+                "active": active,
+                "inactive": len(updates) - active,
+                "failed": failed,
+                "seconds": time.perf_counter() - started,
+            },
+        }
+
+    async def check_account_token(
+        self,
+        account: WBAccountModel,
+        wb_token: str,
+    ) -> (WBAccountModel, bool):
+        values, is_active = await self.validate_account_token(wb_token)
+        async with self.transaction():
+            return await self.wb_account_repo.update_one(account.id, values), is_active
 
     async def ping(
         self,
         account_id: uuid.UUID
     ):
-        account = await self.wb_account_repo.get(account_id)
-        _, is_active = await self.check_account_token(account, wb_token=account.wb_token)
+        wb_token = await self.wb_account_repo.get_where(many=False,
+                                                       whereclause=WBAccountModel.id == account_id,
+                                                       columns=[WBAccountModel.wb_token])
+        if wb_token is None:
+            raise WbAccountNotFoundError
+
+        values, is_active = await self.validate_account_token(wb_token)
+        async with self.transaction():
+            await self.wb_account_repo.update_one(account_id, values)
         return is_active
 
     def check_active_account(self, account: WBAccountModel) -> WBAccountModel:
@@ -196,14 +556,20 @@ class WBAccountsService(BaseService):
 
     async def get_by_id(
             self,
-            account_id: uuid.UUID
+            account_id: uuid.UUID,
+            fields: Optional[Sequence[str]] = None,
     ) -> WBAccountModel:
         """
         Возвращает аккаунт по его id или вызывает исключение AccountNotFound
         :param account_id:
+        :param fields: Загружаемые поля кабинета, по умолчанию все (через кэш сущностей)
         :return:
         """
-        account = await self.wb_account_repo.get(account_id)
+        if fields is not None:
+            account = await self.wb_account_repo.get_where(whereclause=WBAccountModel.id == account_id,
+                                                           fields=fields)
+        else:
+            account = await self.wb_account_repo.get_by("id", account_id, loader=ACCOUNT_LIST)
         if account is None:
             raise WbAccountNotFoundError
         return account
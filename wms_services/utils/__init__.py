@@ -0,0 +1,4 @@
+from wms_services.utils.uuid7 import *
+from wms_services.utils.tabular import *
+from wms_services.utils.jwt_claims import *
+from wms_services.utils.http_pool import *
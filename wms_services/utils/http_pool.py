@@ -0,0 +1,132 @@
+import asyncio
+import importlib.util
+import ssl
+import time
+from typing import Any
+
+import httpx
+
+__all__ = ["HTTPClientPool", "WBTokenClient"]
+
+
+class HTTPClientPool:
+    """
+    Общий на процесс пул HTTP соединений (httpx.AsyncClient) с keep-alive.
+
+    Клиенты отдельных токенов (WBTokenClient) не открывают своих соединений, а берут их из пула,
+    поэтому TCP и TLS рукопожатие с хостом маркетплейса происходит один раз на соединение, а не
+    на каждый запрос. HTTP/2 (если установлен пакет h2 и сервер его поддерживает) мультиплексирует
+    запросы в одном соединении. max_connections ограничивает соединения пула целиком,
+    max_per_host - одновременные запросы к одному хосту, чтобы массовые проверки одного API
+    не занимали весь пул.
+
+    Создается при старте приложения (start) и закрывается при остановке (aclose).
+    """
+
+    def __init__(self,
+                 max_connections: int,
+                 max_per_host: int,
+                 keepalive_expiry: float,
+                 timeout: float,
+                 http2: bool = True,
+                 verify: ssl.SSLContext | bool = True):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.verify = verify
+        # h2 - необязательная зависимость httpx: без нее запросы идут по HTTP/1.1
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self._client: httpx.AsyncClient | None = None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.request_seconds = 0.0
+        self.http_versions: dict[str, int] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return self._client is not None
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections,
+                                keepalive_expiry=self.keepalive_expiry),
+            timeout=self.timeout,
+            verify=self.verify,
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        if self._client is None:
+            raise RuntimeError("HTTP client pool is not started")
+
+        host = httpx.URL(url).host
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+
+        async with semaphore:
+            started = time.perf_counter()
+            self.in_flight += 1
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.requests += 1
+                self.request_seconds += time.perf_counter() - started
+        self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+        return response
+
+    def for_token(self, token: str) -> "WBTokenClient":
+        return WBTokenClient(self, token)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.is_running,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_per_host": self.max_per_host,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_request_ms": self.request_seconds / self.requests * 1000 if self.requests else 0.0,
+            "http_versions": dict(self.http_versions),
+        }
+
+
+class WBTokenClient:
+    """Запросы к API Wildberries с токеном кабинета через общий пул соединений"""
+
+    COMMON_PING_URL = "https://common-api.wildberries.ru/ping"
+
+    def __init__(self, pool: HTTPClientPool, token: str):
+        self.pool = pool
+        self.token = token
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        headers = {**kwargs.pop("headers", {}), "Authorization": self.token}
+        return await self.pool.request(method, url, headers=headers, **kwargs)
+
+    async def common_ping(self) -> bool:
+        """
+        Токен действует: WB API отвечает на ping с этим токеном.
+
+        False - только если ВБ отклонил токен (401/403). Остальные ответы (429, 5xx) и ошибки
+        соединения ничего не говорят о токене и выбрасываются (httpx.HTTPError)
+        """
+        response = await self.request("GET", self.COMMON_PING_URL)
+        if response.status_code in (httpx.codes.UNAUTHORIZED, httpx.codes.FORBIDDEN):
+            return False
+        response.raise_for_status()
+        return True
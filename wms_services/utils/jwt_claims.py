@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import jwt
+
+__all__ = ["token_expires_at"]
+
+
+def token_expires_at(token: str) -> datetime | None:
+    """
+    Срок действия JWT (claim exp) без проверки подписи: подпись токена маркетплейса проверяет
+    сам маркетплейс, здесь срок нужен только для планирования перепроверок.
+    :return: Локальное время истечения (как datetime.now() в колонках кабинета) или None,
+             если токен не разбирается или в нем нет exp
+    """
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return None
+    if not isinstance(exp, (int, float)):
+        return None
+    return datetime.fromtimestamp(exp)
@@ -0,0 +1,63 @@
+import csv
+import io
+from pathlib import Path
+
+from wms_services.exceptions.user_exceptions import UserImportFileError
+
+__all__ = ["read_table"]
+
+CSV_DELIMITERS = ",;\t"
+
+
+def read_table(filename: str, content: bytes) -> list[tuple[int, dict[str, str]]]:
+    """
+    Строки таблицы CSV или XLSX (по расширению файла) с номерами строк файла.
+
+    Первая строка - заголовки, они приводятся к нижнему регистру. Пустые строки пропускаются,
+    пустые ячейки не попадают в словарь строки.
+    """
+    suffix = Path(filename or "").suffix.lower()
+    if suffix == ".csv":
+        rows = _read_csv(content)
+    elif suffix == ".xlsx":
+        rows = _read_xlsx(content)
+    else:
+        raise UserImportFileError("Поддерживаются только файлы .csv и .xlsx")
+
+    header = next(rows, None)
+    if header is None:
+        return []
+    keys = [str(cell or "").strip().lower() for cell in header]
+
+    table = []
+    for number, row in enumerate(rows, start=2):
+        values = {key: str(cell).strip() for key, cell in zip(keys, row)
+                  if key and cell is not None and str(cell).strip()}
+        if values:
+            table.append((number, values))
+    return table
+
+
+def _read_csv(content: bytes):
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise UserImportFileError("CSV файл должен быть в кодировке UTF-8")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(io.StringIO(text), dialect)
+
+
+def _read_xlsx(content: bytes):
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except Exception:
+        raise UserImportFileError("Не удалось прочитать XLSX файл")
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()